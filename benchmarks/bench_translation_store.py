@@ -0,0 +1,131 @@
+"""Micro-benchmark: cache-hit latency of the translations table.
+
+Compares the old connect-per-call access (default rollback journal) with
+TranslationStore (thread-local connections, WAL) at 1, 8 and 32 concurrent
+readers while one background thread keeps writing, as happens when cold
+songs are translated during normal traffic.
+
+    python benchmarks/bench_translation_store.py [--rows 2000] [--reads 500]
+"""
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from translation_store import TranslationStore, CREATE_TRANSLATIONS_SQL  # noqa: E402
+
+LYRICS = ("Original line of a song\n翻訳された歌詞の一行\n\n" * 60)  # ~4 KB
+
+
+def song_id(i):
+    return hashlib.md5(f"artist{i}|track{i}".encode()).hexdigest()
+
+
+class LegacyStore:
+    """The original access pattern: a fresh connection for every call."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def get(self, sid):
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('SELECT translated_lyrics FROM translations WHERE id = ?', (sid,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def save(self, sid, artist, track, lyrics):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('INSERT OR REPLACE INTO translations (id, artist, track, translated_lyrics) VALUES (?, ?, ?, ?)',
+                     (sid, artist, track, lyrics))
+        conn.commit()
+        conn.close()
+
+    def close(self):
+        pass
+
+
+def populate(db_path, rows, wal):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+    conn.execute(CREATE_TRANSLATIONS_SQL)
+    conn.executemany('INSERT OR REPLACE INTO translations (id, artist, track, translated_lyrics) VALUES (?, ?, ?, ?)',
+                     [(song_id(i), f"artist{i}", f"track{i}", LYRICS) for i in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def run(store, rows, readers, reads_per_reader):
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def writer():
+        i = rows
+        while not stop.is_set():
+            try:
+                store.save(song_id(i), f"artist{i}", f"track{i}", LYRICS)
+            except sqlite3.OperationalError:
+                pass
+            i += 1
+            time.sleep(0.005)
+
+    def reader():
+        local = []
+        rnd = random.Random()
+        for _ in range(reads_per_reader):
+            sid = song_id(rnd.randrange(rows))
+            start = time.perf_counter()
+            try:
+                store.get(sid)
+            except sqlite3.OperationalError:
+                # "database is locked" counts as a (very slow) miss
+                pass
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    w = threading.Thread(target=writer, daemon=True)
+    w.start()
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    w.join()
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    return p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--reads', type=int, default=500, help='reads per reader thread')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+
+    print(f"{'store':<8} {'readers':>7} {'p50 ms':>9} {'p99 ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, wal, factory in (('legacy', False, LegacyStore), ('pooled', True, TranslationStore)):
+            db_path = os.path.join(tmp, f"{name}.db")
+            populate(db_path, args.rows, wal)
+            for readers in args.concurrency:
+                store = factory(db_path)
+                p50, p99 = run(store, args.rows, readers, args.reads)
+                store.close()
+                print(f"{name:<8} {readers:>7} {p50:>9.3f} {p99:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Offline load test of the lyrics endpoints with local stand-ins for every upstream.
+
+Spotify is served by StubSpotifyServer; Genius and Gemini are replaced by
+FakeGenius and FakeGeminiModel, each with its own latency and failure rate,
+so cache, coalescing and queueing changes can be measured without API keys
+or quota. Songs are requested with Zipf-distributed popularity (a few hits,
+a long tail), mixed across /lyrics, /force_lyrics and /get_now_playing_info.
+
+The report shows, per endpoint, throughput and p50/p95/p99 latency, plus the
+/lyrics cache hit ratio and how many calls reached each upstream.
+
+    python benchmarks/load_test.py [--songs 500] [--zipf 1.1] [--concurrency 16] [--requests 2000]
+        [--mix lyrics=0.8,force_lyrics=0.02,get_now_playing_info=0.18]
+        [--spotify-latency 0.01] [--genius-latency 0.05] [--gemini-latency 0.2]
+        [--spotify-failure-rate 0] [--genius-failure-rate 0] [--gemini-failure-rate 0]
+        [--warm 0] [--seed 1]
+"""
+import argparse
+import bisect
+import contextlib
+import io
+import itertools
+import os
+import random
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from stubs import FakeGenius, FakeGeminiModel, StubSpotifyServer, load_app, signed_in_client
+
+ENDPOINTS = ('lyrics', 'force_lyrics', 'get_now_playing_info')
+
+
+class ZipfSongs:
+    """Picks (track, artist) pairs with probability proportional to 1 / rank ** s."""
+
+    def __init__(self, count, s, rng):
+        self.songs = [(f"Song {rank}", f"Artist {rank % 97}") for rank in range(1, count + 1)]
+        self.cumulative = list(itertools.accumulate(1 / rank ** s for rank in range(1, count + 1)))
+        self.rng = rng
+        self._lock = threading.Lock()
+
+    def pick(self):
+        with self._lock:
+            x = self.rng.random() * self.cumulative[-1]
+        return self.songs[min(bisect.bisect_left(self.cumulative, x), len(self.songs) - 1)]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}, expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.cache = {'Yes': 0, 'No': 0}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok, cache_used=None):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+            if cache_used in self.cache:
+                self.cache[cache_used] += 1
+
+
+def run(app_module, songs, mix, concurrency, total, seed, results=None):
+    """Send total requests from concurrency signed-in clients; return (Results, elapsed)."""
+    results = results or Results()
+    clients = [signed_in_client(app_module.app) for _ in range(concurrency)]
+    names, weights = zip(*mix.items())
+    remaining = itertools.count()
+
+    def worker(client, rng):
+        while next(remaining) < total:
+            endpoint = rng.choices(names, weights)[0]
+            if endpoint == 'get_now_playing_info':
+                url = '/get_now_playing_info'
+            else:
+                track, artist = songs.pick()
+                url = f"/{endpoint}?{urlencode({'track': track, 'artist': artist})}"
+            start = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - start
+            data = response.get_json(silent=True) or {}
+            ok = response.status_code == 200 and 'error_message' not in data
+            results.record(endpoint, elapsed, ok, data.get('cache_used') if endpoint == 'lyrics' else None)
+
+    workers = [threading.Thread(target=worker, args=(client, random.Random(seed + i)))
+               for i, client in enumerate(clients)]
+    start = time.perf_counter()
+    # The app prints a line or two per request; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed, server, genius, model):
+    total = sum(len(values) for values in results.latencies.values())
+    print(f"{total} requests in {elapsed:.2f}s: {total / elapsed:.1f} req/s")
+    print(f"{'endpoint':<22} {'count':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for endpoint in ENDPOINTS:
+        values = sorted(results.latencies[endpoint])
+        if not values:
+            continue
+        print(f"{endpoint:<22} {len(values):>6} {len(values) / elapsed:>8.1f} "
+              f"{percentile(values, 50) * 1000:>8.1f} {percentile(values, 95) * 1000:>8.1f} "
+              f"{percentile(values, 99) * 1000:>8.1f} {results.errors[endpoint]:>7}")
+    lookups = results.cache['Yes'] + results.cache['No']
+    if lookups:
+        print(f"/lyrics cache hit ratio: {results.cache['Yes'] / lookups:.1%} "
+              f"({results.cache['Yes']} hits, {results.cache['No']} misses)")
+    print(f"upstream calls: spotify={server.requests} (failed {server.failures}), "
+          f"genius={genius.calls} (failed {genius.failures}), gemini={model.calls} (failed {model.failures})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--songs', type=int, default=500, help='size of the song catalogue')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of song popularity')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=2000, help='total requests in the measured run')
+    parser.add_argument('--warm', type=int, default=0, help='requests sent before measuring, to pre-fill the caches')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('lyrics=0.8,force_lyrics=0.02,get_now_playing_info=0.18'),
+                        help='endpoint weights, e.g. lyrics=0.8,force_lyrics=0.02,get_now_playing_info=0.18')
+    parser.add_argument('--spotify-latency', type=float, default=0.01)
+    parser.add_argument('--genius-latency', type=float, default=0.05)
+    parser.add_argument('--gemini-latency', type=float, default=0.2)
+    parser.add_argument('--spotify-failure-rate', type=float, default=0.0)
+    parser.add_argument('--genius-failure-rate', type=float, default=0.0)
+    parser.add_argument('--gemini-failure-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    songs = ZipfSongs(args.songs, args.zipf, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        spolyfy_app = load_app(tmp)
+        server = StubSpotifyServer(latency=args.spotify_latency, failure_rate=args.spotify_failure_rate,
+                                   now_playing=songs.pick).start()
+        spolyfy_app.spotify_clients.api_prefix = server.prefix
+        genius = spolyfy_app.genius = FakeGenius(args.genius_latency, args.genius_failure_rate)
+        model = spolyfy_app.model = FakeGeminiModel(args.gemini_latency, args.gemini_failure_rate)
+
+        if args.warm:
+            run(spolyfy_app, songs, {'lyrics': 1.0}, args.concurrency, args.warm, args.seed + 1000)
+            print(f"warmed with {args.warm} /lyrics requests")
+            server.requests = server.failures = 0
+            genius.calls = genius.failures = 0
+            model.calls = model.failures = 0
+
+        results, elapsed = run(spolyfy_app, songs, args.mix, args.concurrency, args.requests, args.seed)
+        report(results, elapsed, server, genius, model)
+        server.stop()
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+if __name__ == '__main__':
+    main()
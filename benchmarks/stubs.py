@@ -0,0 +1,230 @@
+"""Local stand-ins for the Spotify Web API used by the benchmarks.
+
+StubSpotifyServer is a small threaded HTTP/1.1 server that answers the
+endpoints the app calls with canned JSON after a configurable delay. It counts
+requests and new TCP connections so benchmarks can show connection reuse.
+
+FakeGenius and FakeGeminiModel replace the module-level genius and model
+objects with in-process fakes that have configurable latency and failure
+rates.
+
+load_app() imports spolyfy_app with placeholder credentials inside a scratch
+directory, so the benchmark never touches the real database or access log.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import importlib
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import zlib
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PLACEHOLDER_ENV = {
+    'SPOTIFY_CLIENT_ID': 'benchmark',
+    'SPOTIFY_CLIENT_SECRET': 'benchmark',
+    'GENIUS_API_TOKEN': 'benchmark',
+    'GEMINI_API_KEY': 'benchmark',
+    'REDIRECT_URI': 'http://127.0.0.1:8080',
+    'FLASK_SECRET_KEY': 'benchmark',
+}
+
+def load_app(workdir, **env):
+    """Import and initialize spolyfy_app with its database and log files under workdir."""
+    for name, value in {**PLACEHOLDER_ENV, **env}.items():
+        os.environ.setdefault(name, str(value))
+    os.chdir(workdir)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    module = importlib.import_module('spolyfy_app')
+    module.create_app()
+    return module
+
+def signed_in_client(app):
+    """A Flask test client whose session holds a valid (fake) Spotify token."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['token_info'] = {
+            'access_token': 'benchmark-token',
+            'refresh_token': 'benchmark-refresh',
+            'token_type': 'Bearer',
+            'scope': 'user-read-currently-playing',
+            'expires_in': 3600,
+            'expires_at': int(time.time()) + 3600,
+        }
+    return client
+
+def track_item(track_name, artist_name, track_id='stub'):
+    """A minimal Spotify track object with the fields the app reads."""
+    return {
+        'id': track_id,
+        'type': 'track',
+        'name': track_name,
+        'duration_ms': 200000,
+        'external_ids': {'isrc': f"STUB{track_id}"},
+        'album': {'artists': [{'name': artist_name}]},
+        'artists': [{'name': artist_name}],
+    }
+
+class StubSpotifyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, now_playing=None, port=0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        # (track, artist) tuple, or a callable returning one per request
+        self.now_playing = now_playing or ('Stub Track', 'Stub Artist')
+        self.requests = 0
+        self.connections = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        super().__init__(('127.0.0.1', port), StubSpotifyHandler)
+
+    @property
+    def prefix(self):
+        """Value for spotipy.Spotify.prefix pointing at this server."""
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/"
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class StubSpotifyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this Nagle's
+        # algorithm stalls every response on a kept-alive connection.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.count('requests')
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        # spotipy asks for some endpoints with a trailing slash (/v1/me/)
+        path = self.path.split('?')[0].rstrip('/')
+        if self.server.failure_rate and random.random() < self.server.failure_rate:
+            self.server.count('failures')
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        now_playing = self.server.now_playing
+        track_name, artist_name = now_playing() if callable(now_playing) else now_playing
+        if path == '/v1/me/player/currently-playing':
+            body = {'is_playing': True, 'progress_ms': 1000,
+                    'item': track_item(track_name, artist_name)}
+        elif path == '/v1/me/player/queue':
+            body = {'currently_playing': track_item(track_name, artist_name), 'queue': []}
+        elif path == '/v1/me':
+            body = {'id': 'stub-user', 'display_name': 'Stub User'}
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class UpstreamError(Exception):
+    pass
+
+class FakeUpstream:
+    """Shared latency/failure behaviour and call counting for the fakes."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, failure_message='fake upstream failure'):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_message = failure_message
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            raise UpstreamError(self.failure_message)
+
+class FakeSong:
+    def __init__(self, song_id, lyrics):
+        self.id = song_id
+        self.lyrics = lyrics
+
+class FakeGenius(FakeUpstream):
+    """Stands in for lyricsgenius.Genius.
+
+    Songs are built from a few unique stanzas plus a chorus shared by every
+    tenth song, so the stanza cache sees realistic partial overlap. Tracks
+    whose name contains "missing" are not found.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, stanzas_per_song=6):
+        super().__init__(latency, failure_rate, 'fake Genius failure')
+        self.stanzas_per_song = stanzas_per_song
+
+    def search_song(self, title, artist=None, **kwargs):
+        self.call()
+        if 'missing' in title:
+            return None
+        # Not hash(): string hashes change from run to run, and so would the shared choruses
+        song_id = zlib.crc32(f"{artist}|{title}".encode()) % 10 ** 8
+        stanzas = [f"[Verse {i + 1}]\n{title} line {i} a\n{title} line {i} b\n{artist} line {i} c"
+                   for i in range(self.stanzas_per_song - 1)]
+        stanzas.insert(1, f"[Chorus]\nShared chorus {song_id % 10} oh\nShared chorus {song_id % 10} yeah")
+        return FakeSong(song_id, '\n\n'.join(stanzas))
+
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGeminiModel(FakeUpstream):
+    """Stands in for genai.GenerativeModel; 'translates' by tagging each line."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, stream_chunks=4):
+        super().__init__(latency, failure_rate, '429 fake quota exceeded')
+        self.stream_chunks = stream_chunks
+
+    @staticmethod
+    def translate(prompt):
+        text = prompt.rsplit(': ', 1)[-1]
+        return '\n'.join(f"訳 {line}" if line.strip() else line for line in text.split('\n'))
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if not stream:
+            self.call()
+            return FakeGeminiResponse(self.translate(prompt))
+
+        def chunks():
+            self.call()
+            text = self.translate(prompt)
+            size = max(1, len(text) // self.stream_chunks)
+            for i in range(0, len(text), size):
+                yield FakeGeminiResponse(text[i:i + size])
+        return chunks()
@@ -0,0 +1,189 @@
+"""Circuit breakers for the Genius and Gemini calls.
+
+When an upstream is failing (Gemini over quota, Genius down), every request
+used to make the call anyway and wait for the error, tying up request
+threads and job workers. A breaker counts consecutive failures; once it
+trips, calls fail immediately with CircuitOpenError for reset_timeout
+seconds. After that a limited number of probe calls are let through
+(half-open). A successful probe closes the circuit again; a failed one
+re-opens it.
+
+ConcurrencyLimit is the other half of the protection: it caps how many
+calls to an upstream are in flight at once, so a slow (but not failing)
+upstream cannot take every request and worker thread with it.
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name, retry_after, message=None):
+        super().__init__(message or f"{name} is temporarily unavailable, retrying in {retry_after:.0f} seconds")
+        self.name = name
+        self.retry_after = retry_after
+
+class UpstreamBusyError(CircuitOpenError):
+    """Raised when no call slot for an upstream freed up in time; handled like an open circuit."""
+
+    def __init__(self, name, waited):
+        super().__init__(name, 0.0, f"{name} is busy, gave up after waiting {waited:g} seconds")
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker around one upstream.
+
+    is_failure(exc) decides which exceptions count against the upstream's
+    health; by default all of them do. Exceptions that do not count are
+    still raised to the caller.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, half_open_max_calls=1, is_failure=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure or (lambda exc: True)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        # Called with self._lock held; an open circuit turns half-open once reset_timeout passed
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def before_call(self):
+        """Reserve a call, or raise CircuitOpenError if the upstream should not be called now."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return
+            self.rejected += 1
+            retry_after = max(0.0, self.reset_timeout - (now - self._opened_at))
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"Circuit for {self.name} closed")
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                    print(f"Circuit for {self.name} opened after {self._failures} failures")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def _release(self):
+        # A reserved call ended without telling us anything about the upstream
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    @contextmanager
+    def protect(self):
+        """Guard the with-block as one call to the upstream."""
+        self.before_call()
+        try:
+            yield
+        except GeneratorExit:
+            # A streaming consumer went away mid-call
+            self._release()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                self._release()
+            raise
+        self.record_success()
+
+    def call(self, fn, *args, **kwargs):
+        with self.protect():
+            return fn(*args, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'state': self._current_state(now),
+                'consecutive_failures': self._failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+            }
+
+class ConcurrencyLimit:
+    """At most max_calls concurrent calls to one upstream (0 = no limit).
+
+    A caller that finds every slot taken waits up to timeout seconds and
+    then gets UpstreamBusyError instead of queueing indefinitely.
+    """
+
+    def __init__(self, name, max_calls, timeout=30):
+        self.name = name
+        self.max_calls = max_calls
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_calls) if max_calls > 0 else None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.waited = 0
+        self.rejected = 0
+
+    @contextmanager
+    def slot(self):
+        """Hold one call slot for the with-block."""
+        if self._slots is None:
+            yield
+            return
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waited += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.rejected += 1
+                raise UpstreamBusyError(self.name, self.timeout)
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_calls': self.max_calls,
+                'in_flight': self.in_flight,
+                'peak': self.peak,
+                'waited': self.waited,
+                'rejected': self.rejected,
+            }
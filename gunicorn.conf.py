@@ -0,0 +1,63 @@
+"""Gunicorn settings for running Spolyfy on several cores.
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers are separate processes that share translations.db (SQLite in WAL
+mode). The schema is created or migrated once here, in the master, before
+any worker starts. Each worker is given a stable number, reused when a
+worker is restarted, and writes its own access log (spolyfy-<n>.log).
+The in-memory hot cache is per worker, so its TTL defaults to 5 seconds
+here instead of an hour.
+
+Threaded workers are used because /now_playing_events and /lyrics_stream
+keep a thread busy for as long as a page is open. Open now-playing streams
+are capped at half of each worker's threads (NOW_PLAYING_MAX_STREAMS), so
+/lyrics and /now_playing always have threads left; pages beyond the cap
+poll instead. The now-playing watcher is also per worker: a user whose tabs
+land on different workers has Spotify polled once per worker.
+"""
+import itertools
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Each worker has its own hot cache and does not see the others' saves. A
+# short TTL bounds how long a worker serves a translation that another
+# worker has since replaced (/force_lyrics, background refresh). Set before
+# the master imports the app, so every worker inherits it; .env still wins.
+os.environ.setdefault('HOT_CACHE_TTL', '5')
+
+bind = os.getenv('SPOLYFY_BIND', '0.0.0.0:8080')
+workers = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.getenv('SPOLYFY_THREADS', '32'))
+# Each open /now_playing_events stream holds one of the threads
+os.environ.setdefault('NOW_PLAYING_MAX_STREAMS', str(max(1, threads // 2)))
+# Threaded workers heartbeat independently of long-running streams
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+# HTTPS (see README): SSL_CERTFILE=./cert/server.crt SSL_KEYFILE=./cert/server.key
+certfile = os.getenv('SSL_CERTFILE') or None
+keyfile = os.getenv('SSL_KEYFILE') or None
+
+def on_starting(server):
+    # Migrate and clean up once here; workers (which inherit the environment)
+    # then only read the schema instead of racing each other through init_db()
+    import spolyfy_app
+    spolyfy_app.init_db()
+    spolyfy_app.translation_store.close()
+    os.environ['SPOLYFY_SCHEMA_READY'] = '1'
+
+def pre_fork(server, worker):
+    taken = {getattr(other, 'spolyfy_id', None) for other in server.WORKERS.values()}
+    worker.spolyfy_id = next(n for n in itertools.count() if n not in taken)
+
+def post_fork(server, worker):
+    # Read by spolyfy_app.access_log_path() when the worker loads wsgi.py
+    os.environ['SPOLYFY_WORKER_ID'] = str(worker.spolyfy_id)
@@ -0,0 +1,144 @@
+"""Minimal in-process metrics with Prometheus text exposition.
+
+Only what the app needs: labelled histograms, plus callbacks that report
+gauges and counters owned by other components (cache sizes, queue depth,
+hit counts) at scrape time. StageTimer times the stages of one request,
+feeding a histogram and keeping a per-request breakdown for the JSON
+response.
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            for key, series in items:
+                labels = list(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]!r}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]}")
+        return lines
+
+class CallbackMetric:
+    """A gauge or counter whose value is read from another component at scrape time.
+
+    fn() returns a number, or a dict mapping a label value to a number when
+    labelname is given.
+    """
+
+    def __init__(self, name, documentation, fn, metric_type='gauge', labelname=None):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.metric_type = metric_type
+        self.labelname = labelname
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        value = self.fn()
+        if self.labelname is None:
+            lines.append(f"{self.name} {_format_value(value)}")
+        else:
+            for label, item in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels([(self.labelname, label)])} {_format_value(item)}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def callback(self, *args, **kwargs):
+        return self.register(CallbackMetric(*args, **kwargs))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# error rendering {metric.name}: {_escape(e)}")
+        return '\n'.join(lines) + '\n'
+
+class StageTimer:
+    """Times the stages of one request.
+
+    Each stage is observed in histogram with endpoint, stage and outcome
+    labels, and its duration is kept in .stages for the response body.
+    """
+
+    class _Stage:
+        def __init__(self, outcome):
+            self.outcome = outcome
+
+    def __init__(self, histogram, endpoint):
+        self.histogram = histogram
+        self.endpoint = endpoint
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name, outcome='ok'):
+        """Time the with-block; set .outcome on the yielded object to label the result."""
+        current = self._Stage(outcome)
+        start = time.perf_counter()
+        try:
+            yield current
+        except Exception:
+            current.outcome = 'error'
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, current.outcome)
+
+    def record(self, name, seconds, outcome='ok'):
+        self.histogram.observe(seconds, endpoint=self.endpoint, stage=name, outcome=outcome)
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def breakdown(self):
+        """Stage durations in seconds, rounded for the JSON response."""
+        return {name: round(seconds, 4) for name, seconds in self.stages.items()}
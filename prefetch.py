@@ -0,0 +1,121 @@
+"""Background prefetching of translations for a user's upcoming tracks.
+
+When enabled, a now-playing lookup also reads the user's playback queue (or
+recently played tracks) and queues translation jobs for the next few songs, so
+that by the time the song changes /lyrics is a cache hit. Each user has a
+minimum interval between scans and an hourly budget of prefetched songs.
+Users that have not been scanned for an hour are forgotten.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+# Seconds covered by the per-user budget
+BUDGET_WINDOW = 3600
+
+class Prefetcher:
+    """Rate-limited, per-user prefetch of upcoming tracks.
+
+    fetch_upcoming() is called on a background thread and returns a list of
+    (artist_name, track_name) tuples in play order. is_cached(artist, track)
+    and submit(artist, track) decide whether a track needs work and queue it.
+    """
+
+    def __init__(self, is_cached, submit, lookahead=5, budget_per_hour=30,
+                 min_interval=30, max_workers=2):
+        self.is_cached = is_cached
+        self.submit = submit
+        self.lookahead = lookahead
+        self.budget_per_hour = budget_per_hour
+        self.min_interval = min_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+        self._last_scan = {}   # user key -> monotonic time of last scan
+        self._spent = {}       # user key -> deque of monotonic times of queued songs
+        self._last_prune = time.monotonic()
+        self.scans = 0
+        self.queued = 0
+        self.already_cached = 0
+        self.over_budget = 0
+
+    def maybe_prefetch(self, user_key, fetch_upcoming):
+        """Start a background scan for user_key unless one ran within min_interval.
+
+        Returns True if a scan was started.
+        """
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_scan.get(user_key)
+            if last is not None and now - last < self.min_interval:
+                return False
+            self._last_scan[user_key] = now
+            self.scans += 1
+            if now - self._last_prune >= self.min_interval:
+                self._prune(now)
+        self._executor.submit(self._scan, user_key, fetch_upcoming)
+        return True
+
+    def _take_budget(self, user_key):
+        # Sliding one-hour window of songs queued for this user
+        now = time.monotonic()
+        with self._lock:
+            spent = self._spent.setdefault(user_key, deque())
+            while spent and now - spent[0] > BUDGET_WINDOW:
+                spent.popleft()
+            if len(spent) >= self.budget_per_hour:
+                self.over_budget += 1
+                return False
+            spent.append(now)
+            return True
+
+    def _scan(self, user_key, fetch_upcoming):
+        try:
+            upcoming = fetch_upcoming()
+        except Exception as e:
+            print(f"Prefetch error: {e}")
+            return
+
+        seen = set()
+        for artist_name, track_name in upcoming:
+            if len(seen) >= self.lookahead:
+                break
+            if (artist_name, track_name) in seen:
+                continue
+            seen.add((artist_name, track_name))
+            if self.is_cached(artist_name, track_name):
+                with self._lock:
+                    self.already_cached += 1
+                continue
+            if not self._take_budget(user_key):
+                break
+            try:
+                self.submit(artist_name, track_name)
+            except Exception as e:
+                # Typically a full translation queue; try again on the next scan
+                print(f"Prefetch submit error: {e}")
+                break
+            with self._lock:
+                self.queued += 1
+            print(f"Prefetch queued {track_name} by {artist_name}")
+
+    def _prune(self, now):
+        # Called with self._lock held: forget users idle for the whole budget
+        # window, whose scan interval and spent budget no longer matter.
+        idle_for = max(BUDGET_WINDOW, self.min_interval)
+        for user_key, last in list(self._last_scan.items()):
+            if now - last >= idle_for:
+                del self._last_scan[user_key]
+                self._spent.pop(user_key, None)
+        self._last_prune = now
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._last_scan),
+                'scans': self.scans,
+                'queued': self.queued,
+                'already_cached': self.already_cached,
+                'over_budget': self.over_budget,
+            }
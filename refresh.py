@@ -0,0 +1,91 @@
+"""Background re-translation of stale cache entries.
+
+After a model or prompt change every stored translation is out of date.
+Instead of wiping the database (and taking a storm of cold misses), stale
+entries are still served, and each one that gets read is queued for
+re-translation, stale-while-revalidate style. A global hourly budget keeps
+the refresh traffic to Genius and Gemini under control.
+"""
+from collections import deque
+import threading
+import time
+
+class StaleRefresher:
+    """Rate-limited queueing of re-translations for stale songs.
+
+    submit(artist, track) queues the work (normally as a background
+    translation job). Once queued, a song is not queued again within
+    retry_interval seconds, whether its refresh succeeded or not. If submit
+    fails (a full queue), nothing is spent: the song can be queued again on
+    its next read and the hourly budget is refunded.
+    """
+
+    def __init__(self, submit, budget_per_hour=60, retry_interval=3600, max_tracked=10000):
+        self.submit = submit
+        self.budget_per_hour = budget_per_hour
+        self.retry_interval = retry_interval
+        self.max_tracked = max_tracked
+        self._lock = threading.Lock()
+        self._requested = {}   # (artist, track) -> monotonic time it was queued
+        self._spent = deque()  # monotonic times of queued refreshes, last hour
+        self.queued = 0
+        self.skipped_recent = 0
+        self.over_budget = 0
+        self.failed = 0
+
+    def request(self, artist_name, track_name):
+        """Queue a refresh of the song unless it was queued recently or the budget is spent.
+
+        Returns True if a refresh was queued.
+        """
+        key = (artist_name, track_name)
+        now = time.monotonic()
+        with self._lock:
+            last = self._requested.get(key)
+            if last is not None and now - last < self.retry_interval:
+                self.skipped_recent += 1
+                return False
+            while self._spent and now - self._spent[0] > 3600:
+                self._spent.popleft()
+            if len(self._spent) >= self.budget_per_hour:
+                self.over_budget += 1
+                return False
+            self._spent.append(now)
+            self._requested[key] = now
+            if len(self._requested) > self.max_tracked:
+                self._prune(now)
+        try:
+            self.submit(artist_name, track_name)
+        except Exception as e:
+            # Typically a full translation queue; the next read tries again
+            print(f"Refresh submit error: {e}")
+            with self._lock:
+                self._requested.pop(key, None)
+                try:
+                    self._spent.remove(now)
+                except ValueError:
+                    # Already aged out of the window
+                    pass
+                self.failed += 1
+            return False
+        with self._lock:
+            self.queued += 1
+        print(f"Refresh queued {track_name} by {artist_name}")
+        return True
+
+    def _prune(self, now):
+        # Called with self._lock held
+        for key, requested_at in list(self._requested.items()):
+            if now - requested_at >= self.retry_interval:
+                del self._requested[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'budget_per_hour': self.budget_per_hour,
+                'spent_last_hour': len(self._spent),
+                'queued': self.queued,
+                'skipped_recent': self.skipped_recent,
+                'over_budget': self.over_budget,
+                'failed': self.failed,
+            }
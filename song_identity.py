@@ -0,0 +1,74 @@
+"""Canonical song identity, so that variants of a song share one cache entry.
+
+Spotify names the same song differently on different releases: "Track -
+2011 Remaster", "Track (Live)", "Track (feat. Someone)", "Track - Radio
+Edit". The lyrics are the same, but every variant used to miss the cache and
+pay for its own Genius + Gemini round trip. clean_track_name() strips those
+release suffixes and canonical_key() hashes the cleaned, case- and
+whitespace-insensitive names.
+
+Stored translations are still keyed on the exact artist/track (see
+make_song_id in spolyfy_app.py). The song_aliases table maps a canonical key,
+a Spotify track id or an ISRC to one of them; song_aliases() builds those
+alias strings.
+"""
+import hashlib
+import re
+
+# Release details after " - " ("Track - 2011 Remaster", "Track - Live at Wembley").
+# Language versions ("Japanese Version") are left alone: their lyrics differ.
+VARIANT_WORDS = (
+    r'(\d{4} )?(digital(ly)? )?remaster(ed)?( \d{4})?( version)?( \d{4})?'
+    r'|live( (at|from|in|on) .*| version| \d{4})?'
+    r'|(single|album|mono|stereo|radio|explicit|clean|original|extended) (version|edit|mix)'
+    r'|mono|stereo|radio edit|bonus track|\d+(th|st|nd|rd) anniversary( edition| version)?'
+)
+DASH_SUFFIX = re.compile(rf'\s+[-–—]\s+({VARIANT_WORDS})\s*$', re.IGNORECASE)
+BRACKET_SUFFIX = re.compile(rf'\s*[(\[]({VARIANT_WORDS})[)\]]\s*$', re.IGNORECASE)
+# Feature credits, with or without brackets: "(feat. X)", "[with X]", "ft. X"
+FEATURE_BRACKET = re.compile(r'\s*[(\[](feat\.?|ft\.?|featuring|with)\s[^)\]]*[)\]]', re.IGNORECASE)
+FEATURE_SUFFIX = re.compile(r'\s+(feat\.|ft\.|featuring)\s.*$', re.IGNORECASE)
+
+def normalize_name(name):
+    """Case- and whitespace-insensitive form of an artist or track name."""
+    return ' '.join(name.split()).casefold()
+
+def clean_track_name(track_name):
+    """Return the track name without remaster/live/edit suffixes and feature credits.
+
+    The case is kept, so the result can also be used to search Genius.
+    """
+    cleaned = track_name
+    while True:
+        stripped = FEATURE_BRACKET.sub('', cleaned)
+        stripped = FEATURE_SUFFIX.sub('', stripped)
+        stripped = DASH_SUFFIX.sub('', stripped)
+        stripped = BRACKET_SUFFIX.sub('', stripped)
+        if stripped == cleaned:
+            break
+        cleaned = stripped
+    # A title that is nothing but a variant marker stays as it is
+    return cleaned.strip() or track_name
+
+def clean_artist_name(artist_name):
+    """Return the artist name without a trailing feature credit."""
+    return FEATURE_SUFFIX.sub('', FEATURE_BRACKET.sub('', artist_name)).strip() or artist_name
+
+def canonical_key(artist_name, track_name):
+    """Return the key shared by every variant of a song."""
+    song_key = f"{normalize_name(clean_artist_name(artist_name))}|{normalize_name(clean_track_name(track_name))}"
+    return hashlib.md5(song_key.encode()).hexdigest()
+
+def song_aliases(artist_name, track_name, track_id=None, isrc=None):
+    """Return the song_aliases keys of a song, most specific first.
+
+    A Spotify track id identifies one release, an ISRC one recording (shared
+    by re-releases), and the canonical key every variant of the name.
+    """
+    aliases = []
+    if track_id:
+        aliases.append(f"spotify:{track_id}")
+    if isrc:
+        aliases.append(f"isrc:{isrc.upper()}")
+    aliases.append(f"key:{canonical_key(artist_name, track_name)}")
+    return aliases
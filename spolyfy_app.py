@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, session, request, redirect, render_template
+from flask import Flask, Response, jsonify, session, request, redirect, render_template, url_for
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 import lyricsgenius
@@ -6,13 +6,31 @@ import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import atexit
 import time
+import json
+import base64
 import socket
 import csv
+import io
 from datetime import datetime
-import sqlite3
 import hashlib
+import threading
+import queue
+from translation_store import TranslationStore, HotCache, FTS_COLUMNS
+from song_identity import canonical_key, clean_track_name, song_aliases
+import translation_jobs
+from stanzas import split_stanzas
+from concurrent.futures import ThreadPoolExecutor
+from prefetch import Prefetcher
+from refresh import StaleRefresher
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitOpenError, ConcurrencyLimit
+import uuid
+import functools
+from spotify_clients import SpotifyClientRegistry, NowPlayingCache, NowPlayingWatcher, TooManySubscribers
+from metrics import MetricsRegistry, StageTimer
 
 load_dotenv()
 
@@ -29,57 +47,170 @@ GENIUS_API_TOKEN = os.getenv('GENIUS_API_TOKEN')
 # Gemini API key
 GOOGLE_API_KEY = os.getenv('GEMINI_API_KEY')
 
+# Optional prefetch of translations for the user's upcoming tracks.
+# Playback state and history scopes are only needed for that.
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', '0') == '1'
+SPOTIFY_SCOPE = 'user-read-currently-playing'
+if PREFETCH_ENABLED:
+    SPOTIFY_SCOPE += ' user-read-playback-state user-read-recently-played'
+
 # redirect_uri
 REDIRECT_URI = os.getenv('REDIRECT_URI')
 # same as the one in Spotify app settings
 # REDIRECT_URI = 'http://127.0.0.1:8080'
 
-# Spotipy setup
-client_credentials_manager = SpotifyClientCredentials(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
-sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+
+# Spotipy (client credentials), LyricsGenius and Gemini clients. They hold
+# HTTP sessions and gRPC channels, which must not be shared across a fork,
+# so each process builds its own in init_clients() (see create_app()).
+sp = None
+genius = None
+model = None
+
+def init_clients():
+    """Build the Spotify, Genius and Gemini clients for this process."""
+    global sp, genius, model
+    # Spotipy setup
+    client_credentials_manager = SpotifyClientCredentials(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET)
+    sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+
+    # LyricsGenius setup
+    genius = lyricsgenius.Genius(GENIUS_API_TOKEN)
 
-# LyricsGenius setup
-genius = lyricsgenius.Genius(GENIUS_API_TOKEN)
+    # Gemini setup
+    genai.configure(api_key=GOOGLE_API_KEY)
+    model = genai.GenerativeModel(GEMINI_MODEL)
 
-# Gemini setup
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-2.5-flash')
+# Fail fast while Genius or Gemini keep failing, probing again after a pause
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))  # seconds
+genius_breaker = CircuitBreaker('Genius', failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                                reset_timeout=BREAKER_RESET_TIMEOUT)
+# A blocked prompt is about the song, not about Gemini's health
+gemini_breaker = CircuitBreaker('Gemini', failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                                reset_timeout=BREAKER_RESET_TIMEOUT,
+                                is_failure=lambda e: not isinstance(e, genai.types.BlockedPromptException))
+
+# Caps on concurrent calls to each upstream, per process: with N server
+# workers up to N times as many calls are in flight. A call that waits
+# longer than UPSTREAM_SLOT_TIMEOUT for a slot fails like an open circuit.
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '8'))
+GENIUS_MAX_CONCURRENCY = int(os.getenv('GENIUS_MAX_CONCURRENCY', '4'))
+UPSTREAM_SLOT_TIMEOUT = float(os.getenv('UPSTREAM_SLOT_TIMEOUT', '30'))  # seconds
+gemini_limit = ConcurrencyLimit('Gemini', GEMINI_MAX_CONCURRENCY, timeout=UPSTREAM_SLOT_TIMEOUT)
+genius_limit = ConcurrencyLimit('Genius', GENIUS_MAX_CONCURRENCY, timeout=UPSTREAM_SLOT_TIMEOUT)
+
+# Songs Genius has no lyrics for are not searched again for this long
+LYRICS_NOT_FOUND_TTL = float(os.getenv('LYRICS_NOT_FOUND_TTL', str(24 * 3600)))  # seconds
 
 # SQLite database setup
 DB_PATH = 'translations.db'
+# One connection per thread, WAL journaling (see translation_store.py)
+translation_store = TranslationStore(DB_PATH)
+
+# In-memory hot tier in front of the translations table
+HOT_CACHE_MAX_ENTRIES = int(os.getenv('HOT_CACHE_MAX_ENTRIES', '500'))
+HOT_CACHE_MAX_BYTES = int(os.getenv('HOT_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))  # 32MB
+# Also the longest a re-saved translation can be served stale by another process;
+# gunicorn.conf.py lowers it to 5 seconds for its workers
+HOT_CACHE_TTL = float(os.getenv('HOT_CACHE_TTL', '3600'))  # seconds, 0 = no expiry
+hot_cache = HotCache(max_entries=HOT_CACHE_MAX_ENTRIES,
+                     max_bytes=HOT_CACHE_MAX_BYTES,
+                     ttl=HOT_CACHE_TTL or None)
+
+# Latency metrics, exposed in Prometheus text format on /metrics
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram('spolyfy_stage_duration_seconds',
+                                  'Duration of each stage of a lyrics request.',
+                                  ('endpoint', 'stage', 'outcome'))
+request_seconds = metrics.histogram('spolyfy_request_duration_seconds',
+                                    'Duration of lyrics requests, excluding the Spotify lookup.',
+                                    ('endpoint', 'cache'))
 
 # Configure logging
 log_file = './spolyfy.log'
 log_level = logging.DEBUG
 log_max_bytes = 30 * 1024 * 1024  # 30MB
 log_backup_count = 5  # Rotate through 5 files
+log_flush_interval = float(os.getenv('LOG_FLUSH_INTERVAL', '1.0'))  # seconds
+log_flush_rows = int(os.getenv('LOG_FLUSH_ROWS', '50'))
 
 logger = logging.getLogger('spolyfy_logger')
 logger.setLevel(log_level)
 
 class CSVHandler(logging.Handler):
-    def __init__(self, filename, mode='a', encoding='utf-8'):
+    """Writes access-log records as CSV rows, buffering writes and rotating by size.
+
+    Rows are flushed to disk once flush_rows are pending or flush_interval
+    seconds have passed, whichever comes first. When the file would grow
+    past max_bytes it is rotated like RotatingFileHandler does
+    (spolyfy.log -> spolyfy.log.1 -> ... -> spolyfy.log.<backup_count>).
+    The handler is meant to run behind a QueueListener, so request threads
+    never wait for it.
+    """
+    headers = ['Timestamp', 'Level', 'Track', 'Artist', 'Remote Address', 'Translation Time (s)', 'Cache Used']
+
+    def __init__(self, filename, mode='a', encoding='utf-8', max_bytes=0, backup_count=0,
+                 flush_interval=1.0, flush_rows=50):
         super().__init__()
         self.filename = filename
         self.mode = mode
         self.encoding = encoding
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
         self.stream = None
-        self.writer = None
+        # Bytes in the current file. Kept here because tell() on a text
+        # stream flushes it, which would defeat the buffering.
+        self.size = 0
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
         self.open_file()
         # Write headers if file is empty
         self.write_headers_if_needed()
+        # Flush buffered rows even when no new records arrive
+        self._stop_flusher = threading.Event()
+        if flush_interval:
+            threading.Thread(target=self._flush_periodically, daemon=True, name='csv-log-flush').start()
+
+    def open_file(self, mode=None):
+        self.stream = open(self.filename, mode or self.mode, encoding=self.encoding, newline='')
+        self.size = os.path.getsize(self.filename)
 
-    def open_file(self):
-        self.stream = open(self.filename, self.mode, encoding=self.encoding, newline='')
-        self.writer = csv.writer(self.stream)
+    def format_row(self, row):
+        """Return row as one line of CSV text."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(row)
+        return buffer.getvalue()
+
+    def write_line(self, line):
+        self.stream.write(line)
+        self.size += len(line.encode(self.encoding))
 
     def write_headers_if_needed(self):
         # Check if file is empty
-        if os.path.getsize(self.filename) == 0:
-            headers = ['Timestamp', 'Level', 'Track', 'Artist', 'Remote Address', 'Translation Time (s)', 'Cache Used']
-            self.writer.writerow(headers)
+        if self.size == 0:
+            self.write_line(self.format_row(self.headers))
             self.stream.flush()
 
+    def should_rollover(self, row_size):
+        return self.max_bytes > 0 and self.size + row_size > self.max_bytes
+
+    def do_rollover(self):
+        """Rotate spolyfy.log -> spolyfy.log.1 -> ... and start a new file with headers."""
+        self.stream.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = f"{self.filename}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.filename}.{i + 1}")
+            os.replace(self.filename, f"{self.filename}.1")
+        # Without backups the old file is simply truncated
+        self.open_file(mode='a' if self.backup_count > 0 else 'w')
+        self.write_headers_if_needed()
+
     def emit(self, record):
         try:
             timestamp = self.formatTime(record)
@@ -90,128 +221,634 @@ class CSVHandler(logging.Handler):
             remote_address = getattr(record, 'remote_address', 'N/A')
             translation_time = getattr(record, 'translation_time', 'N/A')
             cache_used = getattr(record, 'cache_used', 'N/A')
-            
+
             row = [timestamp, level, track, artist, remote_address, translation_time, cache_used]
-            self.writer.writerow(row)
-            self.stream.flush()
+            line = self.format_row(row)
+            if self.should_rollover(len(line.encode(self.encoding))):
+                self.flush()
+                self.do_rollover()
+            self.write_line(line)
+            self.pending_rows += 1
+            if (self.pending_rows >= self.flush_rows
+                    or time.monotonic() - self.last_flush >= self.flush_interval):
+                self.flush()
         except Exception as e:
             print(f"CSV Logging error: {e}")
 
+    def flush(self):
+        # Caller may or may not hold the handler lock; the lock is reentrant
+        self.acquire()
+        try:
+            if self.stream and not self.stream.closed and self.pending_rows:
+                self.stream.flush()
+            self.pending_rows = 0
+            self.last_flush = time.monotonic()
+        finally:
+            self.release()
+
+    def _flush_periodically(self):
+        while not self._stop_flusher.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"CSV Logging error: {e}")
+
     def close(self):
-        if self.stream:
-            self.stream.close()
+        self._stop_flusher.set()
+        self.acquire()
+        try:
+            if self.stream:
+                self.stream.flush()
+                self.stream.close()
+        finally:
+            self.release()
+        super().close()
 
     def formatTime(self, record):
-        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Use the time the request was logged, not the time the row is written
+        return datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
+
+# Set by setup_logging(); None until the access log is started
+csv_handler = None
+log_listener = None
+
+def access_log_path():
+    """Return this process's access log file.
+
+    Worker n of a multi-process server (gunicorn.conf.py sets
+    SPOLYFY_WORKER_ID) writes spolyfy-<n>.log, so that no two processes
+    append to or rotate the same file.
+    """
+    worker_id = os.getenv('SPOLYFY_WORKER_ID')
+    if worker_id is None:
+        return log_file
+    root, ext = os.path.splitext(log_file)
+    return f"{root}-{worker_id}{ext}"
+
+def setup_logging():
+    """Start the CSV access log of this process."""
+    global csv_handler, log_listener
+    # Create a rotating, buffered CSV handler
+    csv_handler = CSVHandler(
+        access_log_path(),
+        mode='a',
+        encoding='utf-8',
+        max_bytes=log_max_bytes,
+        backup_count=log_backup_count,
+        flush_interval=log_flush_interval,
+        flush_rows=log_flush_rows
+    )
+
+    # Request threads only put records on a queue; a listener thread writes them
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    log_listener = QueueListener(log_queue, csv_handler, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(stop_logging)
 
-# Create a rotating file handler
-csv_handler = CSVHandler(
-    log_file,
-    mode='a',
-    encoding='utf-8'
-)
+def stop_logging():
+    """Drain the log queue and flush the CSV file."""
+    global log_listener
+    if log_listener is None:
+        return
+    log_listener.stop()
+    log_listener = None
+    csv_handler.close()
 
-# Add the handler to the logger
-logger.addHandler(csv_handler)
+# Gemini failures are raised as TranslationError with a message starting
+# with this prefix. Older versions stored such messages as translations.
+TRANSLATION_ERROR_PREFIX = "Translation error:"
+
+class TranslationError(Exception):
+    """Gemini could not translate the lyrics; the message is shown to the user."""
 
 def init_db():
     """Initialize the SQLite database for storing translations."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS translations (
-        id TEXT PRIMARY KEY,
-        artist TEXT NOT NULL,
-        track TEXT NOT NULL,
-        translated_lyrics TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    conn.commit()
-    conn.close()
+    migrated = translation_store.init_schema()
+    # Only databases from before versioning can hold stored error messages,
+    # so the (full table scan) cleanup runs once, with that migration
+    if ('translations', 'version') in migrated:
+        deleted = translation_store.delete_translations_starting_with(TRANSLATION_ERROR_PREFIX)
+        if deleted:
+            print(f"Removed {deleted} stored translation errors from the cache")
+    if not translation_store.has_aliases():
+        # Databases from before song_aliases: index the stored translations by canonical name
+        rows = [(f"key:{canonical_key(artist, track)}", song_id)
+                for song_id, artist, track in translation_store.iter_translations()]
+        if rows:
+            translation_store.save_aliases(rows, replace=False)
+            print(f"Indexed {len(rows)} stored translations by canonical song name")
 
-def get_translation_from_db(artist_name, track_name):
-    """Check if a translation exists in the database and return it if found."""
-    # Create a unique key for the song
+def make_song_id(artist_name, track_name):
+    """Return the cache key used for a song in the translations table."""
     song_key = f"{artist_name}|{track_name}"
-    song_id = hashlib.md5(song_key.encode()).hexdigest()
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT translated_lyrics FROM translations WHERE id = ?', (song_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result:
+    return hashlib.md5(song_key.encode()).hexdigest()
+
+def make_lyrics_key(artist_name, track_name):
+    """Return the cache key used for a song in the genius_lyrics table.
+
+    Variants of a song (remasters, live versions, feature credits) share it.
+    """
+    return canonical_key(artist_name, track_name)
+
+def find_translation(artist_name, track_name, track_id=None, isrc=None):
+    """Return (song_id, translated_lyrics, version) stored for the song or one of its variants, or None.
+
+    The exact artist/track entry wins. Otherwise the Spotify track id, the
+    ISRC and the canonical name of the song are looked up in song_aliases.
+    Ids seen for the first time are recorded for the entry that was found,
+    so the next lookup by id does not depend on the name.
+    """
+    song_id = make_song_id(artist_name, track_name)
+    entry = translation_store.get_entry(song_id)
+    if entry is None or track_id or isrc:
+        aliases = song_aliases(artist_name, track_name, track_id, isrc)
+        known = translation_store.get_aliases(aliases)
+        if entry is None:
+            for alias in aliases:
+                if alias in known:
+                    song_id = known[alias]
+                    entry = translation_store.get_entry(song_id)
+                    break
+            if entry is None:
+                return None
+            print(f"Translation of {track_name} by {artist_name} found by {alias.split(':')[0]}")
+        new_ids = [(alias, song_id) for alias in aliases[:-1] if alias not in known]
+        if new_ids:
+            translation_store.save_aliases(new_ids, replace=False)
+    return (song_id, *entry)
+
+def get_translation_from_db(artist_name, track_name, track_id=None, isrc=None):
+    """Check if a translation exists in the database and return it if found.
+
+    Variants of the song (see find_translation) count as found.
+    Translations made with an older model or prompt are still returned, and
+    a background re-translation is requested for them (see refresh.py).
+    """
+    # Popular songs are served from memory without hashing or disk I/O.
+    # Only current translations are kept there.
+    result = hot_cache.get((artist_name, track_name))
+    if result is not None:
+        return result
+
+    found = find_translation(artist_name, track_name, track_id, isrc)
+    if found is None:
+        return None
+
+    song_id, result, version = found
+    if version == TRANSLATION_VERSION:
         print(f"Translation found in cache for {track_name} by {artist_name}")
-        return result[0]
-    return None
+        # Grouped by the entry it came from, so saving that entry drops its variants too
+        hot_cache.put((artist_name, track_name), result, group=song_id)
+    else:
+        print(f"Stale translation (version {version}) found in cache for {track_name} by {artist_name}")
+        request_refresh(artist_name, track_name)
+    return result
 
 def save_translation_to_db(artist_name, track_name, translated_lyrics):
     """Save a translation to the database."""
     # Create a unique key for the song
-    song_key = f"{artist_name}|{track_name}"
-    song_id = hashlib.md5(song_key.encode()).hexdigest()
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-    INSERT OR REPLACE INTO translations (id, artist, track, translated_lyrics)
-    VALUES (?, ?, ?, ?)
-    ''', (song_id, artist_name, track_name, translated_lyrics))
-    conn.commit()
-    conn.close()
+    song_id = make_song_id(artist_name, track_name)
+    key_alias = f"key:{canonical_key(artist_name, track_name)}"
+    previous_id = translation_store.get_aliases([key_alias]).get(key_alias)
+    translation_store.save(song_id, artist_name, track_name, translated_lyrics, TRANSLATION_VERSION)
+    # The newest translation of any variant answers for the canonical name
+    translation_store.save_aliases([(key_alias, song_id)])
+    # Variants served from this entry, or from the one the name pointed to before, are stale now
+    hot_cache.invalidate((artist_name, track_name))
+    hot_cache.invalidate_group(song_id)
+    if previous_id is not None:
+        hot_cache.invalidate_group(previous_id)
     print(f"Translation saved to cache for {track_name} by {artist_name}")
 
-# Initialize the database
-init_db()
+def get_remote_address():
+    """Return the client address, which may be behind a proxy or load balancer."""
+    if request:
+        if request.headers.getlist("X-Forwarded-For"):
+            return request.headers.getlist("X-Forwarded-For")[0]
+        elif hasattr(request, 'remote_addr'):
+            return request.remote_addr
+    return "Unknown"
+
+def log_lyrics_request(message, track_name, artist_name, remote_addr, elapsed, cache_used):
+    """Write one lyrics request to the CSV access log."""
+    try:
+        logger.info(
+            message,
+            extra={
+                'track_name': track_name,
+                'artist_name': artist_name,
+                'remote_address': remote_addr,
+                'translation_time': f"{elapsed:.2f}",
+                'cache_used': cache_used
+            }
+        )
+    except Exception as e:
+        print(f"Logging error: {e}")
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its result with concurrent callers.
+
+    When many requests miss the cache for the same song at once, only the first
+    one runs the Genius + Gemini pipeline. The others wait for it and receive the
+    same result (or the same exception) instead of repeating the work.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Call fn() for key, or wait for the in-flight call for the same key.
+
+        Returns a (result, shared) tuple. shared is True when the result came
+        from another caller's run.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+# Coalesces concurrent cache misses for the same song, variants included (keyed on canonical_key)
+translation_flight = SingleFlight()
+
+def fetch_and_translate(artist_name, track_name, use_cache=True, on_text=None, timer=None,
+                        refresh_lyrics=False, refresh_stale=False):
+    """Fetch lyrics from Genius, translate them and save the result to the database.
+
+    Returns the translated lyrics, or None if Genius has no lyrics for the song.
+    With use_cache, the database is checked again first so that a caller that
+    queued behind a finished run does not translate the song a second time.
+    Without it (forced runs) cached stanza translations are not reused either.
+    refresh_stale (background refreshes) only skips a stored translation made
+    with another model or prompt version; stanzas cached with the current one
+    are still reused. If on_text is given, the translation is streamed and on_text is called
+    with each chunk as it arrives. Stage timings are recorded on timer.
+    refresh_lyrics searches Genius again even if the lyrics are cached.
+    """
+    if timer is None:
+        timer = StageTimer(stage_seconds, 'pipeline')
+
+    if refresh_stale:
+        entry = translation_store.get_entry(make_song_id(artist_name, track_name))
+        if entry is not None and entry[1] == TRANSLATION_VERSION:
+            # Refreshed since the job was queued
+            return entry[0]
+    elif use_cache:
+        translated_lyrics = get_translation_from_db(artist_name, track_name)
+        if translated_lyrics is not None:
+            return translated_lyrics
+
+    translated_lyrics = translate_song(artist_name, track_name, on_text=on_text, timer=timer,
+                                       refresh_lyrics=refresh_lyrics, use_cache=use_cache)
+    if translated_lyrics is None:
+        return None
+    # Save translation to database
+    with timer.stage('save_translation'):
+        save_translation_to_db(artist_name, track_name, translated_lyrics)
+    return translated_lyrics
+
+def get_genius_lyrics(artist_name, track_name, refresh=False, timer=None):
+    """Return the Genius lyrics of a song, or None if Genius does not have them.
+
+    Lyrics are cached in the genius_lyrics table with the Genius song id, so
+    re-translations skip the (slow, scraping) Genius search. Songs Genius
+    did not find are not searched again for LYRICS_NOT_FOUND_TTL seconds.
+    refresh ignores both and searches again. Raises CircuitOpenError while
+    Genius is failing or every Genius slot is taken.
+    """
+    if timer is None:
+        timer = StageTimer(stage_seconds, 'pipeline')
+
+    lyrics_key = make_lyrics_key(artist_name, track_name)
+    if not refresh:
+        with timer.stage('lyrics_cache') as stage:
+            cached = translation_store.get_lyrics(lyrics_key)
+            if cached is not None:
+                stage.outcome = 'hit'
+            elif translation_store.is_not_found(lyrics_key, LYRICS_NOT_FOUND_TTL):
+                stage.outcome = 'not_found'
+            else:
+                stage.outcome = 'miss'
+        if cached is not None:
+            print(f"Lyrics found in cache for {track_name} by {artist_name}")
+            return cached[1]
+        if stage.outcome == 'not_found':
+            print(f"Lyrics recently not found for {track_name} by {artist_name}")
+            return None
+
+    # Get lyrics from Genius
+    print(f"Searching for lyrics for {track_name} by {artist_name}")
+    with timer.stage('genius_search') as stage:
+        # Remaster/live suffixes and feature credits only get in the way of the search
+        with genius_limit.slot():
+            song = genius_breaker.call(genius.search_song, clean_track_name(track_name), artist=artist_name)
+        stage.outcome = 'found' if song is not None else 'not_found'
+    if song is None:
+        translation_store.save_not_found(lyrics_key, artist_name, track_name)
+        return None
+
+    translation_store.save_lyrics(lyrics_key, artist_name, track_name, getattr(song, 'id', None), song.lyrics)
+    return song.lyrics
+
+def translate_song(artist_name, track_name, on_text=None, timer=None, refresh_lyrics=False,
+                   use_cache=True):
+    """Get a song's lyrics and translate them, without saving the translation.
+
+    Returns the translated lyrics, or None if Genius has no lyrics for the song.
+    Without use_cache every stanza is sent to Gemini again, ignoring the
+    stanza cache. Raises TranslationError if Gemini fails. Used by
+    fetch_and_translate and by the bulk warmer (spolyfy_warm.py), which saves
+    its results in batches.
+    """
+    if timer is None:
+        timer = StageTimer(stage_seconds, 'pipeline')
+
+    lyrics = get_genius_lyrics(artist_name, track_name, refresh=refresh_lyrics, timer=timer)
+    if lyrics is None:
+        return None
+
+    # Translate lyrics to Japanese
+    print(f"Now translating lyrics to Japanese")
+    with timer.stage('translate'):
+        if STANZA_TRANSLATION:
+            translated_lyrics = translate_lyrics_by_stanza(lyrics, on_text=on_text, use_cache=use_cache)
+        elif on_text is None:
+            translated_lyrics = translate_to_japanese(lyrics)
+        else:
+            chunks = []
+            for chunk in translate_to_japanese_stream(lyrics):
+                chunks.append(chunk)
+                on_text(chunk)
+            translated_lyrics = ''.join(chunks)
+    return translated_lyrics
+
+def get_or_translate(artist_name, track_name, force=False, on_text=None, timer=None,
+                     refresh_lyrics=False, refresh_stale=False):
+    """Return (translated_lyrics, shared) for a song, running the pipeline once per song.
+
+    Concurrent callers for the same song share a single Genius + Gemini run.
+    Forced re-translations use their own key so they never just pick up the
+    result of a normal cache-miss run, but are still coalesced with each other.
+    Refreshes of stale translations (refresh_stale) have their own key too.
+    A caller that waited for someone else's run gets a 'coalesced_wait' stage.
+    """
+    song_key = canonical_key(artist_name, track_name)
+    key = f"force:{song_key}" if force else f"refresh:{song_key}" if refresh_stale else song_key
+    start = time.perf_counter()
+    result, shared = translation_flight.do(
+        key, lambda: fetch_and_translate(artist_name, track_name, use_cache=not force,
+                                         on_text=on_text, timer=timer, refresh_lyrics=refresh_lyrics,
+                                         refresh_stale=refresh_stale))
+    if shared and timer is not None:
+        timer.record('coalesced_wait', time.perf_counter() - start)
+    return result, shared
+
+def run_translation_job(job):
+    """Worker-side body of a background translation job.
+
+    The translation is streamed into the job so /lyrics_stream can forward
+    paragraphs before Gemini has finished the whole song. Refresh jobs
+    re-translate a stale song: they bypass its stored translation, but not
+    the stanzas already translated with the current version.
+    """
+    translated_lyrics, _ = get_or_translate(job.artist_name, job.track_name,
+                                            refresh_stale=job.source == 'refresh',
+                                            on_text=job.append_text,
+                                            timer=StageTimer(stage_seconds, 'job'))
+    return translated_lyrics
+
+def log_translation_job(job):
+    """Log a finished background job like a synchronous /lyrics request."""
+    # Prefetch and refresh jobs are not user requests and stay out of the access log
+    if job.status == translation_jobs.DONE and job.source == 'request':
+        log_lyrics_request("Lyrics translation request (job)", job.track_name, job.artist_name,
+                           job.remote_address or "Unknown", job.elapsed, "Job")
+
+def get_session_key():
+    """Return a random id identifying the browser session, creating it if needed."""
+    if 'session_key' not in session:
+        session['session_key'] = uuid.uuid4().hex
+    return session['session_key']
+
+# One Spotify client per browser session, sharing a pooled keep-alive HTTP session
+SPOTIFY_CLIENT_IDLE_TTL = float(os.getenv('SPOTIFY_CLIENT_IDLE_TTL', '3600'))  # seconds
+SPOTIFY_MAX_CLIENTS = int(os.getenv('SPOTIFY_MAX_CLIENTS', '1000'))
+spotify_clients = SpotifyClientRegistry(SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, REDIRECT_URI,
+                                        SPOTIFY_SCOPE,
+                                        idle_ttl=SPOTIFY_CLIENT_IDLE_TTL,
+                                        max_clients=SPOTIFY_MAX_CLIENTS)
+
+# Per-user now-playing cache shared by every endpoint and browser tab
+NOW_PLAYING_TTL = float(os.getenv('NOW_PLAYING_TTL', '1.5'))  # seconds
+now_playing_cache = NowPlayingCache(ttl=NOW_PLAYING_TTL)
+
+# Server-side watcher pushing track changes to /now_playing_events
+NOW_PLAYING_MAX_INTERVAL = float(os.getenv('NOW_PLAYING_MAX_INTERVAL', '15'))  # seconds
+NOW_PLAYING_IDLE_INTERVAL = float(os.getenv('NOW_PLAYING_IDLE_INTERVAL', '10'))  # seconds
+# Each open stream holds a server thread; beyond this many the page polls instead (0 = no limit)
+NOW_PLAYING_MAX_STREAMS = int(os.getenv('NOW_PLAYING_MAX_STREAMS', '0'))
+now_playing_watcher = NowPlayingWatcher(now_playing_cache,
+                                        max_interval=NOW_PLAYING_MAX_INTERVAL,
+                                        idle_interval=NOW_PLAYING_IDLE_INTERVAL,
+                                        max_subscribers=NOW_PLAYING_MAX_STREAMS or None)
+
+def get_current_track(client):
+    """Return the user's current playback via the now-playing cache."""
+    return now_playing_cache.get(client.session_key, client.spotify.current_user_playing_track)
+
+def spotify_auth_required(on_unauthorized):
+    """Decorator for views that need a signed-in Spotify user.
+
+    The view receives the session's SpotifyClient as the client keyword
+    argument. When the session has no valid token, on_unauthorized() is
+    returned instead.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            client = spotify_clients.get(get_session_key())
+            if not client.is_authorized():
+                return on_unauthorized()
+            return view(*args, client=client, **kwargs)
+        return wrapper
+    return decorator
+
+def spotify_track_ids(item):
+    """Return (track id, ISRC) of a Spotify track object; either may be None."""
+    return item.get('id'), (item.get('external_ids') or {}).get('isrc')
+
+def is_translation_cached(artist_name, track_name):
+    """Whether a translation is stored, without touching the hot cache counters."""
+    return find_translation(artist_name, track_name) is not None
+
+def submit_prefetch(artist_name, track_name):
+    translation_queue.submit(canonical_key(artist_name, track_name), artist_name, track_name,
+                             source='prefetch', max_pending=TRANSLATION_BACKGROUND_QUEUE_SIZE)
+
+def submit_refresh(artist_name, track_name):
+    # Own key, so a refresh never merges with a job that would reuse the stale entry
+    translation_queue.submit(f"refresh:{canonical_key(artist_name, track_name)}", artist_name, track_name,
+                             source='refresh', max_pending=TRANSLATION_BACKGROUND_QUEUE_SIZE)
+
+def request_refresh(artist_name, track_name):
+    """Queue a background re-translation of a stale song, if refresh is enabled."""
+    if TRANSLATION_REFRESH_ENABLED:
+        stale_refresher.request(artist_name, track_name)
+
+def upcoming_tracks(access_token, limit):
+    """Return (artist, track) pairs from the user's queue, or recently played tracks as a fallback.
+
+    Runs on a prefetch thread, outside the request, so it uses the access
+    token directly instead of the session-bound auth manager.
+    """
+    spotify = spotipy.Spotify(auth=access_token, requests_session=spotify_clients.requests_session)
+    try:
+        tracks = spotify.queue()['queue'][:limit]
+    except spotipy.SpotifyException as e:
+        # The queue needs user-read-playback-state; older sessions may lack it
+        print(f"Prefetch: queue unavailable ({e.http_status}), using recently played")
+        tracks = [item['track'] for item in spotify.current_user_recently_played(limit=limit)['items']]
+    return [(track['album']['artists'][0]['name'], track['name'])
+            for track in tracks if track and track.get('type', 'track') == 'track']
+
+def prefetch_upcoming(client):
+    """Warm the translation cache for the signed-in user's next tracks, if prefetch is enabled.
+
+    Also called from the now-playing watcher thread, outside any request.
+    """
+    if not PREFETCH_ENABLED:
+        return
+    # Refreshes an expired token; off-request the refreshed token is kept in memory
+    token_info = client.auth_manager.validate_token(client.cache_handler.get_cached_token())
+    if token_info is None:
+        return
+    prefetcher.maybe_prefetch(client.session_key,
+                              lambda: upcoming_tracks(token_info['access_token'], PREFETCH_TRACKS))
+
+# Stanza-level translation cache: only uncached stanzas go to Gemini, in parallel
+STANZA_TRANSLATION = os.getenv('STANZA_TRANSLATION', '1') == '1'
+STANZA_TRANSLATION_CONCURRENCY = int(os.getenv('STANZA_TRANSLATION_CONCURRENCY', '4'))
+stanza_executor = ThreadPoolExecutor(max_workers=STANZA_TRANSLATION_CONCURRENCY,
+                                     thread_name_prefix='stanza-translation')
+# A song's stanzas go to Gemini in parallel; let them all probe a recovering Gemini
+gemini_breaker.half_open_max_calls = STANZA_TRANSLATION_CONCURRENCY
+
+# Background workers for /lyrics?mode=async
+TRANSLATION_WORKERS = int(os.getenv('TRANSLATION_WORKERS', '4'))
+TRANSLATION_QUEUE_SIZE = int(os.getenv('TRANSLATION_QUEUE_SIZE', '64'))
+# Prefetch and refresh jobs stop at this many pending jobs; the rest is kept for user requests
+TRANSLATION_BACKGROUND_QUEUE_SIZE = int(os.getenv('TRANSLATION_BACKGROUND_QUEUE_SIZE',
+                                                  str(TRANSLATION_QUEUE_SIZE // 2)))
+translation_queue = translation_jobs.TranslationJobQueue(run_translation_job,
+                                                         max_workers=TRANSLATION_WORKERS,
+                                                         max_pending=TRANSLATION_QUEUE_SIZE,
+                                                         on_finish=log_translation_job)
+
+# Prefetch limits (PREFETCH_ENABLED is read with the Spotify settings above)
+PREFETCH_TRACKS = int(os.getenv('PREFETCH_TRACKS', '5'))
+PREFETCH_BUDGET_PER_HOUR = int(os.getenv('PREFETCH_BUDGET_PER_HOUR', '30'))
+PREFETCH_MIN_INTERVAL = float(os.getenv('PREFETCH_MIN_INTERVAL', '30'))  # seconds between scans per user
+prefetcher = Prefetcher(is_translation_cached, submit_prefetch,
+                        lookahead=PREFETCH_TRACKS,
+                        budget_per_hour=PREFETCH_BUDGET_PER_HOUR,
+                        min_interval=PREFETCH_MIN_INTERVAL)
+
+# Background re-translation of entries made with an older model or prompt
+TRANSLATION_REFRESH_ENABLED = os.getenv('TRANSLATION_REFRESH', '1') == '1'
+TRANSLATION_REFRESH_PER_HOUR = int(os.getenv('TRANSLATION_REFRESH_PER_HOUR', '60'))
+stale_refresher = StaleRefresher(submit_refresh, budget_per_hour=TRANSLATION_REFRESH_PER_HOUR)
+
+# Counters owned by the caches and queues, read when /metrics is scraped
+def stat_reader(component, *names):
+    return lambda: {name: component.stats()[name] for name in names}
+
+metrics.callback('spolyfy_hot_cache_events_total', 'Hot cache lookups and evictions.',
+                 stat_reader(hot_cache, 'hits', 'misses', 'evictions'), 'counter', 'event')
+metrics.callback('spolyfy_hot_cache_bytes', 'Bytes held by the hot cache.',
+                 lambda: hot_cache.stats()['bytes'])
+metrics.callback('spolyfy_now_playing_calls_total', 'Now-playing lookups by how they were served.',
+                 stat_reader(now_playing_cache, 'upstream_calls', 'saved_calls', 'rate_limited'),
+                 'counter', 'result')
+metrics.callback('spolyfy_translation_jobs_pending', 'Unfinished background translation jobs.',
+                 lambda: translation_queue.stats()['pending'])
+metrics.callback('spolyfy_circuit_open', 'Whether calls to an upstream are currently refused (1) or not (0).',
+                 lambda: {breaker.name: int(breaker.state == circuit_breaker.OPEN) for breaker in (genius_breaker, gemini_breaker)},
+                 labelname='upstream')
+metrics.callback('spolyfy_circuit_rejected_total', 'Calls refused because the upstream circuit was open.',
+                 lambda: {breaker.name: breaker.stats()['rejected'] for breaker in (genius_breaker, gemini_breaker)},
+                 'counter', 'upstream')
+metrics.callback('spolyfy_upstream_in_flight', 'Calls to an upstream currently in flight in this process.',
+                 lambda: {limit.name: limit.stats()['in_flight'] for limit in (genius_limit, gemini_limit)},
+                 labelname='upstream')
+metrics.callback('spolyfy_upstream_busy_total', 'Calls given up because every upstream slot stayed taken.',
+                 lambda: {limit.name: limit.stats()['rejected'] for limit in (genius_limit, gemini_limit)},
+                 'counter', 'upstream')
+metrics.callback('spolyfy_stale_refresh_total', 'Re-translation requests for stale cache entries.',
+                 stat_reader(stale_refresher, 'queued', 'skipped_recent', 'over_budget', 'failed'),
+                 'counter', 'result')
 
 @app.route('/')
 def index():
-    spotify_username = None
-
-    cache_handler = spotipy.cache_handler.FlaskSessionCacheHandler(session)
-    auth_manager = spotipy.oauth2.SpotifyOAuth(client_id=SPOTIFY_CLIENT_ID,
-                                               client_secret=SPOTIFY_CLIENT_SECRET,
-                                               redirect_uri=REDIRECT_URI,
-                                               scope='user-read-currently-playing',
-                                               cache_handler=cache_handler,
-                                               show_dialog=True)
+    client = spotify_clients.get(get_session_key())
 
     if request.args.get("code"):
         # Step 2. Being redirected from Spotify auth page
-        auth_manager.get_access_token(request.args.get("code"))
+        client.auth_manager.get_access_token(request.args.get("code"))
         return redirect('/')
 
-    if not auth_manager.validate_token(cache_handler.get_cached_token()):
+    if not client.is_authorized():
         # Step 1. Display sign in link when no token
-        auth_url = auth_manager.get_authorize_url()
+        auth_url = client.auth_manager.get_authorize_url()
         return f'<h2><a href="{auth_url}">Sign in</a></h2>'
 
     # Step 3. Signed in, display data
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
-
-    return render_template('web-page.html', spotify_username=spotify.me())
+    return render_template('web-page.html', spotify_username=client.spotify.me())
     # return f'<h2>Hi {spotify.me()["display_name"]}, ' \
     #        f'<small><a href="/sign_out">[sign out]<a/></small></h2>' \
     #        f'<a href="/playlists">my playlists</a> | ' \
     #        f'<a href="/currently_playing">currently playing</a> | ' \
     #     f'<a href="/lyrics">Lyrics</a>' \
 
+@app.route('/sign_out')
+def sign_out():
+    spotify_clients.evict(get_session_key())
+    now_playing_cache.invalidate(get_session_key())
+    session.clear()
+    return redirect('/')
+
 @app.route('/currently_playing')
-def currently_playing():
-    cache_handler = spotipy.cache_handler.FlaskSessionCacheHandler(session)
-    auth_manager = spotipy.oauth2.SpotifyOAuth(client_id=SPOTIFY_CLIENT_ID,
-                                               client_secret=SPOTIFY_CLIENT_SECRET,
-                                               redirect_uri=REDIRECT_URI,
-                                               cache_handler=cache_handler)
-    if not auth_manager.validate_token(cache_handler.get_cached_token()):
-        return redirect('/')
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
-    current_track = spotify.current_user_playing_track()
-    track_name = current_track['item']['name']
-    artist_name = current_track['item']['album']['artists'][0]['name']
-    if current_track:
+@spotify_auth_required(lambda: redirect('/'))
+def currently_playing(client):
+    current_track = get_current_track(client)
+    if current_track and current_track['item']:
+        track_name = current_track['item']['name']
+        artist_name = current_track['item']['album']['artists'][0]['name']
         return jsonify({
             'track_name': track_name,
             'artist_name': artist_name
@@ -219,76 +856,443 @@ def currently_playing():
     return "No track currently playing."
 
 @app.route('/get_now_playing_info')
-def get_now_playing_info():
-   cache_handler = spotipy.cache_handler.FlaskSessionCacheHandler(session)
-   auth_manager = spotipy.oauth2.SpotifyOAuth(client_id=SPOTIFY_CLIENT_ID,
-                                              client_secret=SPOTIFY_CLIENT_SECRET,
-                                              redirect_uri=REDIRECT_URI,
-                                              cache_handler=cache_handler)
-   if not auth_manager.validate_token(cache_handler.get_cached_token()):
-       return jsonify({'track_name': '認証が必要です', 'artist_name': '認証が必要です'})
-   spotify = spotipy.Spotify(auth_manager=auth_manager)
-   current_track = spotify.current_user_playing_track()
+@spotify_auth_required(lambda: jsonify({'track_name': '認証が必要です', 'artist_name': '認証が必要です'}))
+def get_now_playing_info(client):
+   current_track = get_current_track(client)
    if current_track and current_track['item']:
        track_name = current_track['item']['name']
        artist_name = current_track['item']['album']['artists'][0]['name']
-       return jsonify({'track_name': track_name, 'artist_name': artist_name})
+       track_id, isrc = spotify_track_ids(current_track['item'])
+       prefetch_upcoming(client)
+       return jsonify({'track_name': track_name, 'artist_name': artist_name, 'track_id': track_id, 'isrc': isrc})
    return jsonify({'track_name': '再生中の曲はありません', 'artist_name': '再生中の曲はありません'})
 
+def build_translation_prompt(text):
+    """Return the Gemini prompt for translating a song's lyrics."""
+    return f"Your professional of translater who translate to japanese."\
+            f"Translate the song lyrics to Japanese. "\
+            f"The original text might not be in English. whether it is in English or not,Translate it to Japanese."\
+            f"However there is one exception. If it's already in Japanese, just return the original text. " \
+            f"Make sure to keep the original meaning and context. "\
+            f"In the output, please display the translation below the original text, and repeat this for each paragraph."\
+            f"The beginning of the [[text]] may contain summary or background information about the song. Please ignore these."\
+            f"Do not add any extra information. such as the explanation of meanings. please just answer the transrated lyrics."\
+            f"Here are the original lyrics: {text}"
+
+def translation_error_message(e):
+    """Log a Gemini failure and return the message shown to the user."""
+    if isinstance(e, CircuitOpenError):
+        # Expected while Gemini is down; not worth a traceback per request
+        error_message = f"{TRANSLATION_ERROR_PREFIX} {e}"
+        print(error_message)
+        return error_message
+    if isinstance(e, genai.types.BlockedPromptException):
+        error_message = f"{TRANSLATION_ERROR_PREFIX} Prompt was blocked - {e}"
+    # Check for quota exceeded error specifically
+    elif "quota exceeded" in str(e).lower() or "429" in str(e):
+        error_message = f"{TRANSLATION_ERROR_PREFIX} Quota exceeded. Please check your Gemini API plan and billing details. もしくは、選択しているAPIが非推奨になっている可能性があります。最新のモデルを使うようAPI設定を変更してください。"
+    else:
+        error_message = f"{TRANSLATION_ERROR_PREFIX} An unexpected error occurred - {e}"
+    logger.error(error_message, exc_info=True)
+    print(error_message)
+    return error_message
+
 def translate_to_japanese(text):
-    """Translates the given text to Japanese using the Gemini API."""
+    """Translates the given text to Japanese using the Gemini API.
+
+    Raises TranslationError on failure; error messages are never returned
+    as if they were translations.
+    """
     try:
-        prompt = f"Your professional of translater who translate to japanese."\
-                f"Translate the song lyrics to Japanese. "\
-                f"The original text might not be in English. whether it is in English or not,Translate it to Japanese."\
-                f"However there is one exception. If it's already in Japanese, just return the original text. " \
-                f"Make sure to keep the original meaning and context. "\
-                f"In the output, please display the translation below the original text, and repeat this for each paragraph."\
-                f"The beginning of the [[text]] may contain summary or background information about the song. Please ignore these."\
-                f"Do not add any extra information. such as the explanation of meanings. please just answer the transrated lyrics."\
-                f"Here are the original lyrics: {text}"
-
-        response = model.generate_content(prompt)
+        with gemini_limit.slot():
+            response = gemini_breaker.call(model.generate_content, build_translation_prompt(text))
         return response.text
-    except genai.types.BlockedPromptException as e:
-        error_message = f"Translation error: Prompt was blocked - {e}"
-        logger.error(error_message, exc_info=True)
-        print(error_message)
-        return error_message
     except Exception as e:
-        # Check for quota exceeded error specifically
-        if "quota exceeded" in str(e).lower() or "429" in str(e):
-            error_message = f"Translation error: Quota exceeded. Please check your Gemini API plan and billing details. もしくは、選択しているAPIが非推奨になっている可能性があります。最新のモデルを使うようAPI設定を変更してください。"
-        else:
-            error_message = f"Translation error: An unexpected error occurred - {e}"
-        logger.error(error_message, exc_info=True)
-        print(error_message)
-        return error_message
+        raise TranslationError(translation_error_message(e)) from e
 
-@app.route('/lyrics')
-def get_lyrics():
-    cache_handler = spotipy.cache_handler.FlaskSessionCacheHandler(session)
-    auth_manager = spotipy.oauth2.SpotifyOAuth(client_id=SPOTIFY_CLIENT_ID,
-                                               client_secret=SPOTIFY_CLIENT_SECRET,
-                                               redirect_uri=REDIRECT_URI,
-                                               cache_handler=cache_handler)
-    if not auth_manager.validate_token(cache_handler.get_cached_token()):
-        return redirect('/')
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
+def build_stanza_prompt(text):
+    """Return the Gemini prompt for translating a single stanza."""
+    return f"Your professional of translater who translate to japanese."\
+            f"Translate the following stanza of song lyrics to Japanese. "\
+            f"The original text might not be in English. whether it is in English or not,Translate it to Japanese."\
+            f"However there is one exception. If it's already in Japanese, just return the original text. " \
+            f"Make sure to keep the original meaning and context, and keep one translated line per original line. "\
+            f"Output only the translation, without the original text. "\
+            f"Do not add any extra information. such as the explanation of meanings. please just answer the transrated lyrics."\
+            f"Here is the stanza: {text}"
+
+def prompt_version(build_prompt):
+    """Identify the model and prompt template that produce a translation."""
+    return f"{GEMINI_MODEL}:{hashlib.sha1(build_prompt('').encode()).hexdigest()[:10]}"
+
+# Stored translations with another version are served while being refreshed
+STANZA_TRANSLATION_VERSION = prompt_version(build_stanza_prompt)
+TRANSLATION_VERSION = (STANZA_TRANSLATION_VERSION if STANZA_TRANSLATION
+                       else prompt_version(build_translation_prompt))
+
+def translate_stanza(text):
+    """Translate one stanza with Gemini. Errors are raised, not returned."""
+    with gemini_limit.slot():
+        response = gemini_breaker.call(model.generate_content, build_stanza_prompt(text))
+    return response.text.strip()
 
+def translate_lyrics_by_stanza(lyrics, on_text=None, use_cache=True):
+    """Translate lyrics stanza by stanza, reusing cached stanza translations.
+
+    Only stanzas missing from the stanza cache are sent to Gemini, in
+    parallel. Without use_cache (a forced re-translation) every stanza is
+    translated again, and the new translations replace the cached ones. The
+    result keeps the "original then translation" layout of the whole-song
+    prompt. If on_text is given it is called with each finished stanza, in
+    order, as soon as it and all earlier stanzas are ready.
+    """
+    stanzas = split_stanzas(lyrics)
+    keys = {stanza.key for stanza in stanzas if stanza.key}
+    cached = translation_store.get_stanzas(keys, STANZA_TRANSLATION_VERSION) if use_cache else {}
+
+    pending = {}
+    for stanza in stanzas:
+        if stanza.key and stanza.key not in cached and stanza.key not in pending:
+            pending[stanza.key] = stanza_executor.submit(translate_stanza, stanza.body)
+    print(f"Stanzas: {len(stanzas)}, cached: {len(keys) - len(pending)}, translating: {len(pending)}")
+
+    try:
+        rendered = []
+        for stanza in stanzas:
+            if stanza.key in pending:
+                cached[stanza.key] = pending[stanza.key].result()
+            text = stanza.render(cached.get(stanza.key))
+            rendered.append(text)
+            if on_text is not None:
+                on_text(text + '\n\n')
+    except Exception as e:
+        for future in pending.values():
+            future.cancel()
+        raise TranslationError(translation_error_message(e)) from e
+
+    translation_store.save_stanzas([
+        (stanza.key, stanza.body, cached[stanza.key], STANZA_TRANSLATION_VERSION)
+        for stanza in stanzas if stanza.key in pending
+    ])
+    return '\n\n'.join(rendered)
+
+def translate_to_japanese_stream(text):
+    """Like translate_to_japanese, but yields the translation in chunks as Gemini generates it."""
+    try:
+        with gemini_limit.slot(), gemini_breaker.protect():
+            for chunk in model.generate_content(build_translation_prompt(text), stream=True):
+                if chunk.text:
+                    yield chunk.text
+    except Exception as e:
+        raise TranslationError(translation_error_message(e)) from e
+
+@app.route('/now_playing_events')
+@spotify_auth_required(lambda: redirect('/'))
+def now_playing_events(client):
+    """Push the user's track changes as Server-Sent Events.
+
+    Each 'track' event has the same track_name/artist_name fields as
+    /get_now_playing_info, plus playback details. One watcher per user polls
+    Spotify, however many tabs are listening. Each track change also starts
+    the prefetch of the user's next tracks, as /get_now_playing_info does.
+    Once NOW_PLAYING_MAX_STREAMS streams are open, new ones get a 503 and the
+    page falls back to polling /get_now_playing_info.
+    """
+    user_key = client.session_key
+    try:
+        events = now_playing_watcher.subscribe(user_key, client.spotify.current_user_playing_track,
+                                               on_change=lambda state: prefetch_upcoming(client))
+    except TooManySubscribers as e:
+        print(f"Now playing stream refused: {e}")
+        return jsonify({'error': str(e)}), 503
+
+    def generate():
+        try:
+            while True:
+                try:
+                    state = events.get(timeout=15)
+                except queue.Empty:
+                    # Keep proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                data = dict(state)
+                if data['track_name'] is None:
+                    data['track_name'] = data['artist_name'] = '再生中の曲はありません'
+                yield sse_event('track', data)
+        finally:
+            now_playing_watcher.unsubscribe(user_key, events)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of latency histograms and cache counters."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats')
+def cache_stats():
+    """Return hit, miss and eviction counters of the in-memory translation cache.
+
+    Counters are per process; under gunicorn each request sees one worker's.
+    """
+    return jsonify({'worker': {'pid': os.getpid(), 'id': os.getenv('SPOLYFY_WORKER_ID')},
+                    'hot_cache': hot_cache.stats(),
+                    'translation_queue': translation_queue.stats(),
+                    'prefetch': prefetcher.stats(),
+                    'circuit_breakers': {'genius': genius_breaker.stats(), 'gemini': gemini_breaker.stats()},
+                    'upstream_limits': {'genius': genius_limit.stats(), 'gemini': gemini_limit.stats()},
+                    'stale_refresh': dict(stale_refresher.stats(), version=TRANSLATION_VERSION),
+                    'spotify_clients': spotify_clients.stats(),
+                    'now_playing': now_playing_cache.stats(),
+                    'now_playing_watcher': now_playing_watcher.stats()})
+
+def lyrics_job_response(job):
+    """JSON body describing a background job, with links to follow it."""
+    data = job.to_dict()
+    data['status_url'] = url_for('get_lyrics_job', job_id=job.id)
+    data['events_url'] = url_for('lyrics_job_events', job_id=job.id)
+    return data
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# Page sizes for /search and /library
+BROWSE_DEFAULT_LIMIT = 50
+BROWSE_MAX_LIMIT = 200
+
+def page_limit():
+    try:
+        limit = int(request.args.get('limit', BROWSE_DEFAULT_LIMIT))
+    except ValueError:
+        limit = BROWSE_DEFAULT_LIMIT
+    return max(1, min(limit, BROWSE_MAX_LIMIT))
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor(); raises ValueError if it is malformed."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {e}") from e
+
+def stream_json_page(rows, limit, to_item, cursor_of):
+    """Stream {"items": [...], "next": cursor} from a row iterator that yields up to limit + 1 rows.
+
+    Items are written as they are read from SQLite, so a page is never held in
+    memory. next is null on the last page.
+    """
+    def generate():
+        yield '{"items": ['
+        count = 0
+        last = None
+        next_cursor = None
+        for row in rows:
+            if count == limit:
+                next_cursor = cursor_of(last)
+                break
+            yield (',' if count else '') + json.dumps(to_item(row), ensure_ascii=False)
+            count += 1
+            last = row
+        yield f'], "count": {count}, "next": {json.dumps(next_cursor)}}}'
+    return Response(generate(), mimetype='application/json')
+
+@app.route('/search')
+@spotify_auth_required(lambda: (jsonify({'error_message': 'Sign in required'}), 401))
+def search_translations(client):
+    """Full-text search over cached songs: artist, track, original and translated lyrics.
+
+    Query parameters: q (required), field (artist, track, original or
+    translated; all by default), limit and cursor (the next value of the
+    previous page). Newest translations come first.
+    """
+    query = request.args.get('q', '').strip()
+    column = request.args.get('field') or None
+    if not query:
+        return jsonify({'error_message': 'q is required'}), 400
+    if column is not None and column not in FTS_COLUMNS:
+        return jsonify({'error_message': f"field must be one of {', '.join(FTS_COLUMNS)}"}), 400
+    try:
+        before = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        if before is not None and not isinstance(before, int):
+            raise ValueError("invalid cursor")
+    except ValueError as e:
+        return jsonify({'error_message': str(e)}), 400
+
+    limit = page_limit()
+    rows = translation_store.search(query, column=column, limit=limit + 1, before=before)
+
+    def to_item(row):
+        _, song_id, artist_name, track_name, version, created_at, snippet = row
+        return {'id': song_id, 'artist': artist_name, 'track': track_name, 'snippet': snippet,
+                'version': version, 'created_at': created_at}
+    return stream_json_page(rows, limit, to_item, lambda row: encode_cursor(row[0]))
+
+@app.route('/library')
+@spotify_auth_required(lambda: (jsonify({'error_message': 'Sign in required'}), 401))
+def browse_library(client):
+    """Page through cached songs ordered by artist and track.
+
+    Query parameters: artist (exact match, optional), limit and cursor.
+    """
+    try:
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        if after is not None and not (isinstance(after, list) and len(after) == 3):
+            raise ValueError("invalid cursor")
+    except ValueError as e:
+        return jsonify({'error_message': str(e)}), 400
+
+    limit = page_limit()
+    rows = translation_store.browse(limit=limit + 1, after=after, artist=request.args.get('artist') or None)
+
+    def to_item(row):
+        song_id, artist_name, track_name, version, created_at = row
+        return {'id': song_id, 'artist': artist_name, 'track': track_name,
+                'version': version, 'created_at': created_at}
+    return stream_json_page(rows, limit, to_item, lambda row: encode_cursor([row[1], row[2], row[0]]))
+
+@app.route('/lyrics_jobs/<job_id>')
+def get_lyrics_job(job_id):
+    """Return the current state of a background translation job."""
+    job = translation_queue.get(job_id)
+    if job is None:
+        return jsonify({'job_id': job_id, 'status': 'unknown', 'error_message': 'Unknown job'}), 404
+    return jsonify(lyrics_job_response(job))
+
+@app.route('/lyrics_jobs/<job_id>/events')
+def lyrics_job_events(job_id):
+    """Stream status changes of a background job as Server-Sent Events.
+
+    Sends a 'status' event for every state change and a final 'done' event
+    carrying the same fields as a /lyrics response.
+    """
+    job = translation_queue.get(job_id)
+    if job is None:
+        return jsonify({'job_id': job_id, 'status': 'unknown', 'error_message': 'Unknown job'}), 404
+
+    def generate():
+        status = None
+        while True:
+            if job.finished:
+                yield sse_event('done', job.to_dict())
+                return
+            version = job.version
+            if job.status != status:
+                status = job.status
+                yield sse_event('status', {'job_id': job.id, 'status': status})
+            if not job.wait(timeout=15, seen_version=version):
+                # Keep proxies from closing an idle connection
+                yield ": keepalive\n\n"
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/lyrics_stream')
+@spotify_auth_required(lambda: redirect('/'))
+def stream_lyrics(client):
+    """Stream the translated lyrics of a song as Server-Sent Events.
+
+    Sends one 'paragraph' event per finished paragraph (original followed by
+    its translation) as Gemini produces them, then a 'done' event with the
+    same fields as a /lyrics response. Cache hits are sent in one go.
+    """
+    track_name = request.args.get('track')
+    artist_name = request.args.get('artist')
+    if not track_name or not artist_name:
+        return jsonify({'error_message': 'track and artist are required'}), 400
+
+    print(f"Streaming lyrics for: {track_name}, Artist: {artist_name}")
+    remote_addr = get_remote_address()
+    start_time = time.time()
+    translated_lyrics = get_translation_from_db(artist_name, track_name,
+                                                request.args.get('track_id'), request.args.get('isrc'))
+
+    def paragraphs(text, final):
+        # Everything before the last blank line is complete; the tail may
+        # still be growing unless the text is final.
+        parts = text.split('\n\n')
+        return parts if final else parts[:-1]
+
+    def generate():
+        if translated_lyrics is not None:
+            elapsed = time.time() - start_time
+            log_lyrics_request("Lyrics translation request (stream)", track_name, artist_name,
+                               remote_addr, elapsed, "Yes")
+            for paragraph in paragraphs(translated_lyrics, final=True):
+                yield sse_event('paragraph', {'text': paragraph})
+            yield sse_event('done', {
+                'artist': artist_name,
+                'track': track_name,
+                'translated_lyrics': translated_lyrics,
+                'get_lyrics_time': f"{elapsed:.2f}",
+                'cache_used': "Yes"
+            })
+            return
+
+        try:
+            job = translation_queue.submit(canonical_key(artist_name, track_name),
+                                           artist_name, track_name, remote_addr)
+        except translation_jobs.QueueFull as e:
+            yield sse_event('done', {'artist': artist_name, 'track': track_name,
+                                     'translated_lyrics': '', 'error_message': str(e)})
+            return
+
+        sent = 0
+        while True:
+            version = job.version
+            finished = job.finished
+            text = job.translated_lyrics if job.status == translation_jobs.DONE else job.partial_text
+            ready = paragraphs(text, final=finished) if text else []
+            for paragraph in ready[sent:]:
+                yield sse_event('paragraph', {'text': paragraph})
+            sent = max(sent, len(ready))
+            if finished:
+                done = job.to_dict()
+                done['cache_used'] = "No"
+                yield sse_event('done', done)
+                return
+            if not job.wait(timeout=15, seen_version=version):
+                yield ": keepalive\n\n"
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def degraded_lyrics_response(artist_name, track_name, error, timer):
+    """Response for a song Genius or Gemini failed on: the untranslated lyrics, if cached."""
+    cached = translation_store.get_lyrics(make_lyrics_key(artist_name, track_name))
+    return jsonify({
+        'artist': artist_name,
+        'track': track_name,
+        'translated_lyrics': cached[1] if cached is not None else "",
+        'error_message': str(error),
+        'degraded': True,
+        'stages': timer.breakdown()
+    })
+
+@app.route('/lyrics')
+@spotify_auth_required(lambda: redirect('/'))
+def get_lyrics(client):
     """
     Retrieves the currently playing song information from Spotify,
     fetches the lyrics from Genius, and translates them to Japanese if needed.
     Returns the song information, original lyrics, and translated lyrics as a JSON response.
     """
+    timer = StageTimer(stage_seconds, 'lyrics')
     try:
         # Get track and artist from request parameters
         track_name = request.args.get('track')
         artist_name = request.args.get('artist')
+        # Optional Spotify ids; they find the song even if its name differs from the cached one
+        track_id = request.args.get('track_id')
+        isrc = request.args.get('isrc')
 
         if not track_name or not artist_name:
             # Fallback to currently playing if parameters are missing (for backward compatibility if needed)
-            current_track = spotify.current_user_playing_track()
+            with timer.stage('spotify_now_playing'):
+                current_track = get_current_track(client)
             if current_track is None or current_track['item'] is None:
                 return jsonify({
                     'artist': 'No song playing',
@@ -297,6 +1301,7 @@ def get_lyrics():
                 })
             track_name = current_track['item']['name']
             artist_name = current_track['item']['album']['artists'][0]['name']
+            track_id, isrc = spotify_track_ids(current_track['item'])
 
         # just for debugging
         print(f"Fetching lyrics for: {track_name}, Artist: {artist_name}")
@@ -309,76 +1314,67 @@ def get_lyrics():
         # Start timing the translation process
         get_lyrics_start_time = time.time()
 
-        translated_lyrics = get_translation_from_db(artist_name, track_name)
-        cache_used = translated_lyrics is not None
+        with timer.stage('cache_lookup') as stage:
+            translated_lyrics = get_translation_from_db(artist_name, track_name, track_id, isrc)
+            cache_used = translated_lyrics is not None
+            stage.outcome = 'hit' if cache_used else 'miss'
 
-        # If not in database, Get lyrics from Genius then translate and save
+        # In job mode a miss is handed to the background workers and the
+        # client follows /lyrics_jobs/<job_id> (or its event stream) instead.
+        if translated_lyrics is None and request.args.get('mode') == 'async':
+            try:
+                job = translation_queue.submit(canonical_key(artist_name, track_name),
+                                               artist_name, track_name, get_remote_address())
+                return jsonify(lyrics_job_response(job)), 202
+            except translation_jobs.QueueFull as e:
+                # Too much work queued already: fall back to translating inline
+                print(f"Translation queue full, translating inline: {e}")
+
+        # If not in database, Get lyrics from Genius then translate and save.
+        # Concurrent misses for the same song share one Genius + Gemini run.
         if translated_lyrics is None:
-            # Get lyrics from Genius
-            print(f"Searching for lyrics for {track_name} by {artist_name}")
-            song = genius.search_song(track_name, artist=artist_name)
-            if song is None:
+            translated_lyrics, shared = get_or_translate(artist_name, track_name, timer=timer)
+            if shared:
+                print(f"Shared an in-flight translation for {track_name} by {artist_name}")
+            if translated_lyrics is None:
                 return jsonify({
                     'artist': artist_name,
                     'track': track_name,
-                    'translated_lyrics': 'Lyrics not found'
+                    'translated_lyrics': 'Lyrics not found',
+                    'stages': timer.breakdown()
                 })
 
-            lyrics = song.lyrics
-            # print(f"Lyrics found: {lyrics}")
-
-            # Translate lyrics to Japanese
-            print(f"Now translating lyrics to Japanese")
-            translated_lyrics = translate_to_japanese(lyrics)
-            # Save translation to database
-            save_translation_to_db(artist_name, track_name, translated_lyrics)
-
         
         # Calculate translation time
         get_lyrics_time = time.time() - get_lyrics_start_time
+        request_seconds.observe(get_lyrics_time, endpoint='lyrics', cache='hit' if cache_used else 'miss')
         print(f"get_lyrics time: {get_lyrics_time:.2f} seconds, Cache used: {'Yes' if cache_used else 'No'}")
 
         # Log the access
-        # Get the remote address, which may be behind a proxy or load balancer
-        if request:
-            if request.headers.getlist("X-Forwarded-For"):
-                remote_addr = request.headers.getlist("X-Forwarded-For")[0]
-            elif hasattr(request, 'remote_addr'):
-                remote_addr = request.remote_addr
-            else:
-                remote_addr = "Unknown"
-        else:
-            remote_addr = "Unknown"
+        remote_addr = get_remote_address()
 
         # Provide default values in case they are not available
         track_name = track_name if track_name else "Unknown Track"
         artist_name = artist_name if artist_name else "Unknown Artist"
         translated_lyrics = translated_lyrics if translated_lyrics else "No Lyrics"
 
-        try:
-            # Include translation time and cache usage in the log
-            logger.info(
-                "Lyrics translation request",
-                extra={
-                    'track_name': track_name,
-                    'artist_name': artist_name,
-                    'translated_lyrics': translated_lyrics,
-                    'remote_address': remote_addr,
-                    'translation_time': f"{get_lyrics_time:.2f}",
-                    'cache_used': "Yes" if cache_used else "No"
-                }
-            )
-        except Exception as e:
-            print(f"Logging error: {e}")
+        # Include translation time and cache usage in the log
+        log_lyrics_request("Lyrics translation request", track_name, artist_name,
+                           remote_addr, get_lyrics_time, "Yes" if cache_used else "No")
 
         return jsonify({
             'artist': artist_name,
             'track': track_name,
             'translated_lyrics': translated_lyrics,
             'get_lyrics_time': f"{get_lyrics_time:.2f}",
-            'cache_used': "Yes" if cache_used else "No"
+            'cache_used': "Yes" if cache_used else "No",
+            'stages': timer.breakdown()
         })
 
+    except (TranslationError, CircuitOpenError) as e:
+        # Nothing was cached; the next request tries again
+        return degraded_lyrics_response(artist_name, track_name, e, timer)
+
     except Exception as e:
         error_message = str(e)
         print(f"Error: {error_message}")
@@ -390,21 +1386,15 @@ def get_lyrics():
         })
 
 @app.route('/force_lyrics')
-def force_get_lyrics():
+@spotify_auth_required(lambda: redirect('/'))
+def force_get_lyrics(client):
     """
     Retrieves the currently playing song information from Spotify,
     fetches the lyrics from Genius, and translates them to Japanese.
     This endpoint ignores the database cache and always performs a new translation.
+    Lyrics already fetched from Genius are reused unless refresh_lyrics=1 is given.
     """
-    cache_handler = spotipy.cache_handler.FlaskSessionCacheHandler(session)
-    auth_manager = spotipy.oauth2.SpotifyOAuth(client_id=SPOTIFY_CLIENT_ID,
-                                               client_secret=SPOTIFY_CLIENT_SECRET,
-                                               redirect_uri=REDIRECT_URI,
-                                               cache_handler=cache_handler)
-    if not auth_manager.validate_token(cache_handler.get_cached_token()):
-        return redirect('/')
-    spotify = spotipy.Spotify(auth_manager=auth_manager)
-
+    timer = StageTimer(stage_seconds, 'force_lyrics')
     try:
         # Get track and artist from request parameters
         track_name = request.args.get('track')
@@ -412,7 +1402,8 @@ def force_get_lyrics():
 
         if not track_name or not artist_name:
             # Fallback to currently playing
-            current_track = spotify.current_user_playing_track()
+            with timer.stage('spotify_now_playing'):
+                current_track = get_current_track(client)
             if current_track is None or current_track['item'] is None:
                 return jsonify({
                     'artist': 'No song playing',
@@ -431,71 +1422,49 @@ def force_get_lyrics():
         # Force new translation by ignoring cache
         print(f"Force re-getting lyrics for {track_name} by {artist_name}")
         
-        # Get lyrics from Genius
-        print(f"Searching for lyrics for {track_name} by {artist_name}")
-        song = genius.search_song(track_name, artist=artist_name)
-        if song is None:
+        # Get lyrics from Genius, translate and save (update cache).
+        # Concurrent forced requests for the same song share one run.
+        refresh_lyrics = request.args.get('refresh_lyrics') == '1'
+        translated_lyrics, _ = get_or_translate(artist_name, track_name, force=True, timer=timer,
+                                                refresh_lyrics=refresh_lyrics)
+        if translated_lyrics is None:
             return jsonify({
                 'artist': artist_name,
                 'track': track_name,
-                'translated_lyrics': 'Lyrics not found'
+                'translated_lyrics': 'Lyrics not found',
+                'stages': timer.breakdown()
             })
-
-        lyrics = song.lyrics
-        # print(f"Lyrics found: {lyrics}")
-
-        # Translate lyrics to Japanese
-        print(f"Now translating lyrics to Japanese")
-        translated_lyrics = translate_to_japanese(lyrics)
-        
-        # Save translation to database (update cache)
-        save_translation_to_db(artist_name, track_name, translated_lyrics)
         
         # Calculate time
         get_lyrics_time = time.time() - get_lyrics_start_time
+        request_seconds.observe(get_lyrics_time, endpoint='force_lyrics', cache='force')
         print(f"Force re-get lyrics time: {get_lyrics_time:.2f} seconds")
 
         # Log the access
-        # Get the remote address, which may be behind a proxy or load balancer
-        if request:
-            if request.headers.getlist("X-Forwarded-For"):
-                remote_addr = request.headers.getlist("X-Forwarded-For")[0]
-            elif hasattr(request, 'remote_addr'):
-                remote_addr = request.remote_addr
-            else:
-                remote_addr = "Unknown"
-        else:
-            remote_addr = "Unknown"
+        remote_addr = get_remote_address()
 
         # Provide default values in case they are not available
         track_name = track_name if track_name else "Unknown Track"
         artist_name = artist_name if artist_name else "Unknown Artist"
         translated_lyrics = translated_lyrics if translated_lyrics else "No Lyrics"
 
-        try:
-            # Include time and force flag in the log
-            logger.info(
-                "Lyrics translation request (forced)",
-                extra={
-                    'track_name': track_name,
-                    'artist_name': artist_name,
-                    'translated_lyrics': translated_lyrics,
-                    'remote_address': remote_addr,
-                    'translation_time': f"{get_lyrics_time:.2f}",
-                    'cache_used': "Force"
-                }
-            )
-        except Exception as e:
-            print(f"Logging error: {e}")
+        # Include time and force flag in the log
+        log_lyrics_request("Lyrics translation request (forced)", track_name, artist_name,
+                           remote_addr, get_lyrics_time, "Force")
 
         return jsonify({
             'artist': artist_name,
             'track': track_name,
             'translated_lyrics': translated_lyrics,
             'get_lyrics_time': f"{get_lyrics_time:.2f}",
-            'cache_used': "Force"
+            'cache_used': "Force",
+            'stages': timer.breakdown()
         })
 
+    except (TranslationError, CircuitOpenError) as e:
+        # Nothing was cached; the next request tries again
+        return degraded_lyrics_response(artist_name, track_name, e, timer)
+
     except Exception as e:
         error_message = str(e)
         print(f"Error: {error_message}")
@@ -506,7 +1475,33 @@ def force_get_lyrics():
             'error_message': error_message # エラーメッセージをウェブページに渡す
         })
 
+_app_initialized = False
+_app_init_lock = threading.Lock()
+
+def create_app():
+    """Initialize this process and return the Flask app.
+
+    Builds the upstream clients, creates or migrates the database schema and
+    starts the access log. Importing this module does none of that, so a
+    pre-forking server can import it before starting its workers; each
+    worker then calls create_app() itself (see wsgi.py and gunicorn.conf.py).
+    When SPOLYFY_SCHEMA_READY=1 (set by gunicorn.conf.py after running
+    init_db() in the master), workers only read the existing schema.
+    Later calls in the same process just return the app.
+    """
+    global _app_initialized
+    with _app_init_lock:
+        if not _app_initialized:
+            init_clients()
+            if os.getenv('SPOLYFY_SCHEMA_READY') == '1':
+                translation_store.load_schema()
+            else:
+                init_db()
+            setup_logging()
+            _app_initialized = True
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True, port=8080)
+    create_app().run(debug=True, port=8080)
     # Uncomment the following line to run with SSL
     # app.run(debug=False, host="0.0.0.0", port=8080, ssl_context=('./cert/server.crt', './cert/server.key'))
@@ -0,0 +1,91 @@
+"""Translation cache hit ratio from the access log, before and after song-name normalization.
+
+Reads spolyfy.log (and rotated or per-worker copies, in any order) and reports:
+
+- the hit ratio as logged (Cache Used = Yes), keyed on the exact names;
+- the estimated hit ratio with normalization: a logged miss counts as a
+  hit if a variant of the song (same canonical_key, other exact name, see
+  song_identity.py) was translated earlier in the log;
+- both ratios replayed from an empty, unbounded cache, which leaves out
+  whatever was cached before the log starts;
+- the variant groups that merge the most requests.
+
+Forced re-translations are not counted as requests, but they do put songs
+in the cache.
+
+    python spolyfy_hit_ratio.py spolyfy.log spolyfy.log.1 spolyfy.log.2
+"""
+import argparse
+from collections import defaultdict
+import csv
+
+from song_identity import canonical_key, clean_track_name
+
+# Values the app writes to the access log when it has no real song
+PLACEHOLDER_NAMES = {'', 'N/A', 'Unknown Track', 'Unknown Artist', 'Error', 'No song playing'}
+
+def read_requests(paths):
+    """Return (timestamp, artist, track, cache_used) rows of the access logs, oldest first."""
+    rows = []
+    for path in paths:
+        with open(path, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                artist_name, track_name = (row.get('Artist') or '').strip(), (row.get('Track') or '').strip()
+                if artist_name in PLACEHOLDER_NAMES or track_name in PLACEHOLDER_NAMES:
+                    continue
+                rows.append((row.get('Timestamp') or '', artist_name, track_name, row.get('Cache Used')))
+    # Timestamps are "%Y-%m-%d %H:%M:%S"; the sort is stable within a second
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+def ratio(hits, total):
+    return f"{hits / total:.1%}" if total else "n/a"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='+', metavar='FILE', help='access logs (spolyfy.log and rotated copies)')
+    parser.add_argument('--top', type=int, default=10, help='variant groups to list')
+    args = parser.parse_args()
+
+    requests = read_requests(args.logs)
+    logged_hits = estimated_hits = replay_exact_hits = replay_canonical_hits = counted = forced = 0
+    seen_exact = set()
+    names_by_key = defaultdict(set)    # canonical key -> exact (artist, track) names translated so far
+    requests_by_key = defaultdict(int)
+    for _, artist_name, track_name, cache_used in requests:
+        name = (artist_name, track_name)
+        song_key = canonical_key(artist_name, track_name)
+        if cache_used == 'Force':
+            forced += 1
+        elif cache_used in ('Yes', 'No'):
+            counted += 1
+            requests_by_key[song_key] += 1
+            logged_hit = cache_used == 'Yes'
+            logged_hits += logged_hit
+            # A variant with another name was translated before: normalization turns the miss into a hit
+            estimated_hits += logged_hit or bool(names_by_key[song_key] - {name})
+            replay_exact_hits += name in seen_exact
+            replay_canonical_hits += bool(names_by_key[song_key])
+        else:
+            continue
+        seen_exact.add(name)
+        names_by_key[song_key].add(name)
+
+    print(f"{counted} lyrics requests in {len(args.logs)} log file(s), {forced} forced re-translations not counted")
+    print(f"Logged hit ratio (exact names):          {ratio(logged_hits, counted)}")
+    print(f"Estimated hit ratio (normalized names):  {ratio(estimated_hits, counted)}"
+          f"  ({estimated_hits - logged_hits} Genius + Gemini round trips saved)")
+    print(f"Replayed from an empty cache, exact:      {ratio(replay_exact_hits, counted)}")
+    print(f"Replayed from an empty cache, normalized: {ratio(replay_canonical_hits, counted)}")
+
+    groups = sorted(((requests_by_key[key], names) for key, names in names_by_key.items() if len(names) > 1),
+                    key=lambda group: -group[0])
+    if groups:
+        print(f"\n{len(groups)} songs requested under more than one name; top {min(args.top, len(groups))}:")
+        for count, names in groups[:args.top]:
+            artist_name, track_name = min(names)
+            variants = ', '.join(sorted(f'"{track}"' for _, track in names))
+            print(f"  {clean_track_name(track_name)} by {artist_name}: {count} requests as {variants}")
+
+if __name__ == '__main__':
+    main()
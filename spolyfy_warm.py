@@ -0,0 +1,236 @@
+"""Pre-translate songs in bulk so users never wait for a cold cache.
+
+Songs come from a Spotify playlist or album (read with the app's
+client-credentials client), or from CSV files of artist/track pairs. The
+access log spolyfy.log and its rotated copies can be passed as they are.
+Songs whose translation (or a variant's, see song_identity.py) is already
+stored with the current model+prompt version are skipped. The others
+go through Genius and Gemini in a small thread pool at a limited rate, with
+retries, and finished translations are committed in batches.
+
+Lyrics already fetched from Genius are reused, so --retranslate (for
+example after a prompt or model change) re-translates every stale or
+missing song in the lyrics cache without searching Genius again.
+
+With --resume, every committed (or not found) song is appended to a
+progress file. An interrupted run can then be restarted without repeating
+work.
+
+    python spolyfy_warm.py --playlist 37i9dQZF1DXcBWIGoYBM5M
+    python spolyfy_warm.py --album <album id> --concurrency 2 --rate 20
+    python spolyfy_warm.py --csv spolyfy.log spolyfy.log.1 --resume warm_progress.txt
+    python spolyfy_warm.py --retranslate --resume retranslate_progress.txt
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import csv
+import os
+import random
+import threading
+import time
+
+import spolyfy_app
+from spolyfy_app import TRANSLATION_VERSION, find_translation, make_song_id, translate_song, translation_store
+from song_identity import canonical_key
+
+# Values the app writes to the access log when it has no real song
+PLACEHOLDER_NAMES = {'', 'N/A', 'Unknown Track', 'Unknown Artist', 'Error', 'No song playing'}
+
+class RateLimiter:
+    """Spaces calls evenly so that at most per_minute start in any minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
+def playlist_songs(sp, playlist_id):
+    """Yield (artist, track) for each track of a playlist, using the album artist like the app does."""
+    results = sp.playlist_items(playlist_id, additional_types=('track',))
+    while results:
+        for item in results['items']:
+            track = item.get('track')
+            if not track or track.get('type') != 'track' or not track.get('album'):
+                continue
+            yield track['album']['artists'][0]['name'], track['name']
+        results = sp.next(results) if results.get('next') else None
+
+def album_songs(sp, album_id):
+    """Yield (artist, track) for each track of an album."""
+    album = sp.album(album_id)
+    artist_name = album['artists'][0]['name']
+    results = album['tracks']
+    while results:
+        for track in results['items']:
+            yield artist_name, track['name']
+        results = sp.next(results) if results.get('next') else None
+
+def csv_songs(path):
+    """Yield (artist, track) from a CSV file.
+
+    Files with the access-log header (Track/Artist columns) or an
+    artist/track header are read by column name. Files without a header are
+    read as artist,track rows.
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [name.strip().lower() for name in header]
+        if 'artist' in columns and 'track' in columns:
+            artist_index, track_index = columns.index('artist'), columns.index('track')
+        else:
+            artist_index, track_index = 0, 1
+            rows = [header, *rows]
+        for row in rows:
+            if len(row) > max(artist_index, track_index):
+                yield row[artist_index].strip(), row[track_index].strip()
+
+def load_progress(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+def is_current(artist_name, track_name):
+    found = find_translation(artist_name, track_name)
+    return found is not None and found[2] == TRANSLATION_VERSION
+
+def collect_songs(args, done_ids):
+    """Return the de-duplicated (artist, track) list still to translate, and how many were skipped."""
+    sources = []
+    if args.playlist:
+        sources.append(playlist_songs(spolyfy_app.sp, args.playlist))
+    if args.album:
+        sources.append(album_songs(spolyfy_app.sp, args.album))
+    for path in args.csv or ():
+        sources.append(csv_songs(path))
+    if args.retranslate:
+        sources.append(translation_store.iter_lyrics())
+
+    songs = []
+    seen = set()
+    skipped = 0
+    for source in sources:
+        for artist_name, track_name in source:
+            if artist_name in PLACEHOLDER_NAMES or track_name in PLACEHOLDER_NAMES:
+                continue
+            # Variants of a song (remasters, live versions) are translated once
+            song_key = canonical_key(artist_name, track_name)
+            if song_key in seen:
+                continue
+            seen.add(song_key)
+            song_id = make_song_id(artist_name, track_name)
+            if song_id in done_ids or is_current(artist_name, track_name):
+                skipped += 1
+                continue
+            songs.append((song_id, artist_name, track_name))
+            if args.limit and len(songs) >= args.limit:
+                return songs, skipped
+    return songs, skipped
+
+def warm_one(song, limiter, retries, backoff):
+    """Translate one song with retries. Returns (song, translated lyrics or None if not on Genius)."""
+    song_id, artist_name, track_name = song
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            return song, translate_song(artist_name, track_name)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            print(f"Retrying {track_name} by {artist_name} in {delay:.1f}s ({e})")
+            time.sleep(delay)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--playlist', help='Spotify playlist id, URI or URL')
+    parser.add_argument('--album', help='Spotify album id, URI or URL')
+    parser.add_argument('--csv', nargs='+', metavar='FILE', help='CSV files of artist/track pairs (spolyfy.log works)')
+    parser.add_argument('--retranslate', action='store_true',
+                        help='re-translate every stale or missing song in the Genius lyrics cache')
+    parser.add_argument('--concurrency', type=int, default=4, help='songs translated at the same time')
+    parser.add_argument('--rate', type=float, default=30, help='maximum songs started per minute, retries included (0 = no limit)')
+    parser.add_argument('--retries', type=int, default=3, help='retries per song after a failure')
+    parser.add_argument('--backoff', type=float, default=5.0, help='base delay in seconds between retries')
+    parser.add_argument('--batch-size', type=int, default=20, help='translations per database commit')
+    parser.add_argument('--resume', metavar='FILE', help='progress file to skip finished songs and record new ones')
+    parser.add_argument('--limit', type=int, default=0, help='translate at most this many songs')
+    parser.add_argument('--dry-run', action='store_true', help='only list the songs that would be translated')
+    args = parser.parse_args()
+    if not (args.playlist or args.album or args.csv or args.retranslate):
+        parser.error('give at least one of --playlist, --album, --csv or --retranslate')
+
+    # Clients and schema only; the warmer does not write to the access log
+    spolyfy_app.init_clients()
+    spolyfy_app.init_db()
+    songs, skipped = collect_songs(args, load_progress(args.resume))
+    print(f"{len(songs)} songs to translate, {skipped} already done")
+    if args.dry_run:
+        for _, artist_name, track_name in songs:
+            print(f"{artist_name} - {track_name}")
+        return
+
+    limiter = RateLimiter(args.rate)
+    progress = open(args.resume, 'a', encoding='utf-8') if args.resume else None
+    batch = []
+    finished = []
+    counts = {'saved': 0, 'not_found': 0, 'failed': 0}
+
+    def commit():
+        if batch:
+            translation_store.save_many(batch)
+            translation_store.save_aliases([(f"key:{canonical_key(artist_name, track_name)}", song_id)
+                                            for song_id, artist_name, track_name, _, _ in batch])
+            counts['saved'] += len(batch)
+        # Only record progress once the translations are on disk
+        if progress is not None and finished:
+            progress.writelines(f"{song_id}\n" for song_id in finished)
+            progress.flush()
+        batch.clear()
+        finished.clear()
+        print(f"[{sum(counts.values())}/{len(songs)}] saved {counts['saved']}, "
+              f"not found {counts['not_found']}, failed {counts['failed']}")
+
+    # Not a with-block: leaving one waits for every queued song, which on
+    # Ctrl-C would keep calling Gemini for results that are never saved
+    executor = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='warm')
+    try:
+        futures = {executor.submit(warm_one, song, limiter, args.retries, args.backoff): song for song in songs}
+        for future in as_completed(futures):
+            song_id, artist_name, track_name = futures[future]
+            try:
+                _, translated_lyrics = future.result()
+            except Exception as e:
+                counts['failed'] += 1
+                print(f"Failed: {track_name} by {artist_name}: {e}")
+                continue
+            finished.append(song_id)
+            if translated_lyrics is None:
+                counts['not_found'] += 1
+            else:
+                batch.append((song_id, artist_name, track_name, translated_lyrics, TRANSLATION_VERSION))
+            if len(batch) >= args.batch_size:
+                commit()
+    except KeyboardInterrupt:
+        print("Interrupted, saving finished translations")
+    finally:
+        # Drop the songs that have not started; only the ones in flight still finish
+        executor.shutdown(wait=False, cancel_futures=True)
+        commit()
+        if progress is not None:
+            progress.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,396 @@
+"""Per-session Spotify clients.
+
+Building a SpotifyOAuth and a spotipy.Spotify on every request also builds a
+new HTTP session, so every poll of the page paid for a fresh TCP + TLS
+connection to Spotify. The registry keeps one client per browser session and
+shares a single pooled keep-alive requests.Session between all of them.
+
+NowPlayingCache collapses the now-playing lookups of all endpoints and tabs
+of one user into at most one upstream call per TTL window, and
+NowPlayingWatcher polls it from one background thread per listening user to
+push track changes to the page. Watchers are per process: a user whose
+streams land on several server workers is polled once per worker.
+"""
+from collections import OrderedDict
+import queue
+import threading
+import time
+
+from flask import has_request_context, session
+import requests
+from requests.adapters import HTTPAdapter
+import spotipy
+from spotipy.cache_handler import CacheHandler
+from urllib3.util.retry import Retry
+
+# Transient server errors are retried by the shared session. 429 is left out
+# on purpose: retrying it would sleep for Retry-After inside the request, so
+# it is surfaced to NowPlayingCache instead. urllib3 also retries any status
+# that carries a Retry-After header, which make_requests_session() turns off.
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+class TooManySubscribers(Exception):
+    """Raised when NowPlayingWatcher already has max_subscribers open streams."""
+
+class SessionTokenCacheHandler(CacheHandler):
+    """Token cache backed by the Flask session, with an in-memory copy.
+
+    During a request the Flask session is the source of truth (it is what the
+    browser sends back). Outside a request, e.g. on a background thread, the
+    last token seen is used, and refreshed tokens are kept in memory until
+    the next request writes them back to the session.
+    """
+
+    def __init__(self):
+        self.token_info = None
+        self._lock = threading.Lock()
+
+    def get_cached_token(self):
+        with self._lock:
+            if has_request_context():
+                token_info = session.get('token_info')
+                if (token_info is not None and self.token_info is not None
+                        and self.token_info.get('expires_at', 0) > token_info.get('expires_at', 0)):
+                    # Refreshed on a background thread since the last request
+                    session['token_info'] = self.token_info
+                else:
+                    self.token_info = token_info
+            return self.token_info
+
+    def save_token_to_cache(self, token_info):
+        with self._lock:
+            self.token_info = token_info
+            if has_request_context():
+                session['token_info'] = token_info
+
+class SpotifyClient:
+    """Auth manager and API client belonging to one browser session."""
+
+    def __init__(self, auth_manager, cache_handler, spotify, session_key=None):
+        self.session_key = session_key
+        self.auth_manager = auth_manager
+        self.cache_handler = cache_handler
+        self.spotify = spotify
+        self.last_used = time.monotonic()
+
+    def is_authorized(self):
+        """Validate (and refresh if needed) the session's token."""
+        return bool(self.auth_manager.validate_token(self.cache_handler.get_cached_token()))
+
+class SpotifyClientRegistry:
+    """Keeps one SpotifyClient per session key, evicting idle or excess clients."""
+
+    def __init__(self, client_id, client_secret, redirect_uri, scope,
+                 idle_ttl=3600, max_clients=1000, pool_maxsize=32, api_prefix=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.scope = scope
+        self.idle_ttl = idle_ttl
+        self.max_clients = max_clients
+        # Overridable for tests and benchmarks against a local stub server
+        self.api_prefix = api_prefix
+        self.requests_session = self.make_requests_session(pool_maxsize)
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    @staticmethod
+    def make_requests_session(pool_maxsize):
+        """A keep-alive HTTP session whose connection pool is shared by every client."""
+        requests_session = requests.Session()
+        retry = Retry(total=3, connect=None, read=False, status=3, backoff_factor=0.3,
+                      allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                      status_forcelist=RETRY_STATUS_CODES, respect_retry_after_header=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+        requests_session.mount('https://', adapter)
+        requests_session.mount('http://', adapter)
+        return requests_session
+
+    def build(self, requests_session, session_key=None):
+        cache_handler = SessionTokenCacheHandler()
+        auth_manager = spotipy.oauth2.SpotifyOAuth(client_id=self.client_id,
+                                                   client_secret=self.client_secret,
+                                                   redirect_uri=self.redirect_uri,
+                                                   scope=self.scope,
+                                                   cache_handler=cache_handler,
+                                                   show_dialog=True,
+                                                   requests_session=requests_session)
+        spotify = spotipy.Spotify(auth_manager=auth_manager, requests_session=requests_session)
+        if self.api_prefix:
+            spotify.prefix = self.api_prefix
+        return SpotifyClient(auth_manager, cache_handler, spotify, session_key)
+
+    def get(self, session_key):
+        """Return the client for session_key, creating it on first use."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            client = self._clients.get(session_key)
+            if client is not None:
+                self._clients.move_to_end(session_key)
+                self.reused += 1
+            else:
+                client = self.build(self.requests_session, session_key)
+                self._clients[session_key] = client
+                self.created += 1
+                while len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+                    self.evicted += 1
+            client.last_used = now
+            return client
+
+    def evict(self, session_key):
+        """Forget the client for session_key, e.g. on sign-out."""
+        with self._lock:
+            if self._clients.pop(session_key, None) is not None:
+                self.evicted += 1
+
+    def _evict_idle(self, now):
+        # Called with self._lock held; entries are ordered by last use.
+        while self._clients:
+            session_key, client = next(iter(self._clients.items()))
+            if now - client.last_used < self.idle_ttl:
+                break
+            del self._clients[session_key]
+            self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': len(self._clients),
+                'created': self.created,
+                'reused': self.reused,
+                'evicted': self.evicted,
+            }
+
+class NowPlayingCache:
+    """Short-TTL cache of each user's currently playing track.
+
+    Every endpoint asks this cache instead of Spotify. Concurrent lookups for
+    the same user wait for a single upstream call, and results are reused for
+    ttl seconds. A 429 from Spotify blocks upstream calls for that user for
+    the Retry-After period, serving the last known value meanwhile.
+    """
+
+    class _Entry:
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.value = None
+            self.fetched_at = None
+            self.blocked_until = 0.0
+
+    def __init__(self, ttl=1.5, default_retry_after=5, max_users=10000):
+        self.ttl = ttl
+        self.default_retry_after = default_retry_after
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.saved_calls = 0
+        self.rate_limited = 0
+
+    def _entry(self, user_key):
+        with self._lock:
+            entry = self._entries.get(user_key)
+            if entry is None:
+                entry = self._entries[user_key] = self._Entry()
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(user_key)
+            return entry
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, user_key, fetch, max_age=None):
+        """Return the user's current playback, calling fetch() only when the cached value is too old.
+
+        max_age overrides the TTL for this call (0 forces an upstream call
+        unless the user is rate limited).
+        """
+        max_age = self.ttl if max_age is None else max_age
+        entry = self._entry(user_key)
+        with entry.lock:
+            now = time.monotonic()
+            if entry.fetched_at is not None and now - entry.fetched_at < max_age:
+                self._count('saved_calls')
+                return entry.value
+            if now < entry.blocked_until:
+                self._count('saved_calls')
+                return entry.value
+
+            self._count('upstream_calls')
+            try:
+                entry.value = fetch()
+            except spotipy.SpotifyException as e:
+                if e.http_status != 429:
+                    raise
+                retry_after = self.default_retry_after
+                try:
+                    retry_after = float(e.headers.get('Retry-After', retry_after))
+                except (TypeError, ValueError):
+                    pass
+                entry.blocked_until = time.monotonic() + retry_after
+                self._count('rate_limited')
+                print(f"Spotify rate limit hit, backing off for {retry_after:.0f} seconds")
+                return entry.value
+            entry.fetched_at = time.monotonic()
+            return entry.value
+
+    def invalidate(self, user_key):
+        with self._lock:
+            self._entries.pop(user_key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._entries),
+                'ttl': self.ttl,
+                'upstream_calls': self.upstream_calls,
+                'saved_calls': self.saved_calls,
+                'rate_limited': self.rate_limited,
+            }
+
+def summarize_playback(current_track):
+    """Reduce a currently-playing response to the fields pushed to the page."""
+    if not current_track or not current_track.get('item'):
+        return {'track_id': None, 'isrc': None, 'track_name': None, 'artist_name': None, 'is_playing': False,
+                'progress_ms': None, 'duration_ms': None}
+    item = current_track['item']
+    return {
+        'track_id': item.get('id'),
+        'isrc': (item.get('external_ids') or {}).get('isrc'),
+        'track_name': item['name'],
+        'artist_name': item['album']['artists'][0]['name'] if item.get('album') else None,
+        'is_playing': bool(current_track.get('is_playing')),
+        'progress_ms': current_track.get('progress_ms'),
+        'duration_ms': item.get('duration_ms'),
+    }
+
+class NowPlayingWatcher:
+    """Polls Spotify once per listening user and pushes track changes to subscribers.
+
+    The poll interval adapts to playback: while a track is playing the
+    watcher sleeps until shortly after it is expected to end (bounded by
+    min_interval and max_interval, so skips are still noticed); when
+    nothing is playing it polls every idle_interval. A user's thread stops
+    once their last subscriber disconnects. Every subscriber holds a server
+    thread, so max_subscribers (None for no limit) caps them per process.
+    """
+
+    class _Watch:
+        def __init__(self, fetch, on_change=None):
+            self.fetch = fetch
+            self.on_change = on_change
+            self.subscribers = set()
+            self.last_event = None
+            self.wake = threading.Event()
+
+    def __init__(self, cache, min_interval=2, max_interval=15, idle_interval=10, slack=1.0,
+                 max_subscribers=None):
+        self.cache = cache
+        self.max_subscribers = max_subscribers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_interval = idle_interval
+        self.slack = slack
+        self._watches = {}
+        self._subscribers = 0
+        self._lock = threading.Lock()
+        self.polls = 0
+        self.events = 0
+        self.rejected = 0
+
+    def subscribe(self, user_key, fetch, on_change=None):
+        """Register a subscriber for user_key and return its event queue.
+
+        fetch() must work outside a request (see SessionTokenCacheHandler).
+        The latest known state, if any, is queued right away. on_change(state)
+        is called on the watcher thread once per track change, however many
+        subscribers the user has. Raises TooManySubscribers when
+        max_subscribers streams are already open.
+        """
+        events = queue.Queue()
+        with self._lock:
+            if self.max_subscribers is not None and self._subscribers >= self.max_subscribers:
+                self.rejected += 1
+                raise TooManySubscribers(f"{self._subscribers} now playing streams already open")
+            self._subscribers += 1
+            watch = self._watches.get(user_key)
+            start = watch is None
+            if start:
+                watch = self._watches[user_key] = self._Watch(fetch, on_change)
+            watch.fetch = fetch
+            watch.on_change = on_change
+            watch.subscribers.add(events)
+            if watch.last_event is not None:
+                events.put(watch.last_event)
+        if start:
+            threading.Thread(target=self._run, args=(user_key, watch), daemon=True,
+                             name=f"now-playing-{user_key[:8]}").start()
+        return events
+
+    def unsubscribe(self, user_key, events):
+        with self._lock:
+            watch = self._watches.get(user_key)
+            if watch is None or events not in watch.subscribers:
+                return
+            self._subscribers -= 1
+            watch.subscribers.discard(events)
+            if not watch.subscribers:
+                del self._watches[user_key]
+                watch.wake.set()
+
+    def next_interval(self, state):
+        """Seconds to wait before polling again for the given playback state."""
+        if not state['is_playing'] or not state['duration_ms'] or state['progress_ms'] is None:
+            return self.idle_interval
+        remaining = (state['duration_ms'] - state['progress_ms']) / 1000 + self.slack
+        return max(self.min_interval, min(self.max_interval, remaining))
+
+    def _run(self, user_key, watch):
+        while True:
+            with self._lock:
+                if self._watches.get(user_key) is not watch:
+                    return
+            try:
+                current_track = self.cache.get(user_key, watch.fetch, max_age=self.min_interval)
+                state = summarize_playback(current_track)
+            except Exception as e:
+                print(f"Now playing watcher error: {e}")
+                state = None
+            with self._lock:
+                self.polls += 1
+                previous = watch.last_event
+                changed = state is not None and (
+                    previous is None
+                    or (state['track_id'], state['track_name']) != (previous['track_id'], previous['track_name']))
+                if changed:
+                    watch.last_event = state
+                    self.events += 1
+                    for events in watch.subscribers:
+                        events.put(state)
+                on_change = watch.on_change
+            if changed and on_change is not None:
+                try:
+                    on_change(state)
+                except Exception as e:
+                    print(f"Now playing watcher error: {e}")
+            interval = self.next_interval(state) if state is not None else self.idle_interval
+            watch.wake.wait(interval)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._watches),
+                'subscribers': self._subscribers,
+                'max_subscribers': self.max_subscribers,
+                'rejected': self.rejected,
+                'polls': self.polls,
+                'events': self.events,
+            }
@@ -0,0 +1,67 @@
+"""Splitting song lyrics into stanzas for per-stanza translation caching.
+
+Remasters, live versions and covers share most of their verses, so each
+stanza's translation is cached under a hash of its normalized text. Section
+headers such as "[Chorus: Artist]" are kept in the output but left out of the
+hash, since they differ between otherwise identical stanzas.
+"""
+import hashlib
+import re
+
+SECTION_HEADER_RE = re.compile(r'^\s*\[[^\]]*\]\s*$')
+# "123 ContributorsTranslations...Song Title Lyrics" at the top of Genius pages
+GENIUS_HEADER_RE = re.compile(r'^\d*\s*Contributors?.*?Lyrics', re.IGNORECASE)
+# Trailing "Embed" / "123Embed" and the "You might also like" widget text,
+# which is often glued to the start of the following line
+GENIUS_EMBED_RE = re.compile(r'\d*Embed\s*$')
+GENIUS_NOISE_RE = re.compile(r'^You might also like(\[)?')
+
+class Stanza:
+    """One stanza: optional section header lines plus the lyric lines to translate."""
+
+    def __init__(self, header, body):
+        self.header = header
+        self.body = body
+
+    @property
+    def key(self):
+        """Cache key of the stanza body, or None for a header-only stanza."""
+        return stanza_hash(self.body) if self.body else None
+
+    def render(self, translation=None):
+        """Original stanza followed by its translation, as the whole-song prompt lays it out."""
+        lines = [part for part in (self.header, self.body, translation) if part]
+        return '\n'.join(lines)
+
+def clean_genius_lyrics(lyrics):
+    """Strip the page header and embed footer that lyricsgenius leaves in the text."""
+    lines = lyrics.strip().split('\n')
+    if lines and GENIUS_HEADER_RE.match(lines[0]):
+        lines[0] = GENIUS_HEADER_RE.sub('', lines[0], count=1)
+    if lines:
+        lines[-1] = GENIUS_EMBED_RE.sub('', lines[-1])
+    # When the widget text is glued to a section header it replaced the blank
+    # line between two stanzas, so put that blank line back.
+    lines = [GENIUS_NOISE_RE.sub(lambda m: '\n[' if m.group(1) else '', line) for line in lines]
+    return '\n'.join(lines).strip()
+
+def split_stanzas(lyrics):
+    """Split lyrics into Stanza objects on blank lines."""
+    stanzas = []
+    for block in re.split(r'\n\s*\n', clean_genius_lyrics(lyrics)):
+        lines = [line.rstrip() for line in block.strip().split('\n') if line.strip()]
+        if not lines:
+            continue
+        header_lines = []
+        while lines and SECTION_HEADER_RE.match(lines[0]):
+            header_lines.append(lines.pop(0).strip())
+        stanzas.append(Stanza('\n'.join(header_lines), '\n'.join(lines)))
+    return stanzas
+
+def normalize_stanza(text):
+    """Case-fold and collapse whitespace so trivially different stanzas share a key."""
+    return '\n'.join(' '.join(line.split()) for line in text.casefold().split('\n') if line.strip())
+
+def stanza_hash(text):
+    """Content hash used as the stanza cache key."""
+    return hashlib.sha1(normalize_stanza(text).encode('utf-8')).hexdigest()
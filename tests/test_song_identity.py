@@ -0,0 +1,69 @@
+import pytest
+
+from song_identity import canonical_key, clean_artist_name, clean_track_name, song_aliases
+
+@pytest.mark.parametrize('track_name, expected', [
+    # Release variants share the song's entry
+    ('Bohemian Rhapsody - 2011 Remaster', 'Bohemian Rhapsody'),
+    ('Bohemian Rhapsody - Remastered 2011', 'Bohemian Rhapsody'),
+    ('Song - 2015 Remastered Version', 'Song'),
+    ('Song - Remastered', 'Song'),
+    ('Song (Remastered)', 'Song'),
+    ('Song (Live)', 'Song'),
+    ('Song (Live Version)', 'Song'),
+    ('Song - Live at Wembley 1986', 'Song'),
+    ('Song - Radio Edit', 'Song'),
+    ('Song - Single Version', 'Song'),
+    ('Song - Mono', 'Song'),
+    ('Song [Bonus Track]', 'Song'),
+    ('Song - 20th Anniversary Edition', 'Song'),
+    # Feature credits, bracketed or not
+    ('Song (feat. Someone)', 'Song'),
+    ('Song [with Someone]', 'Song'),
+    ('Song ft. Someone', 'Song'),
+    ('Song featuring Someone', 'Song'),
+    # Several suffixes at once
+    ('Song (feat. Someone) - 2011 Remaster', 'Song'),
+    ('Song [with Someone] - Remastered 2009', 'Song'),
+    # Different lyrics or a different song: kept
+    ('Song - Japanese Version', 'Song - Japanese Version'),
+    ('Song (Remix)', 'Song (Remix)'),
+    ('Song - Acoustic', 'Song - Acoustic'),
+    ('Live and Let Die', 'Live and Let Die'),
+    ('Live Forever', 'Live Forever'),
+    ('Mono', 'Mono'),
+    # Nothing but a marker: the name is not emptied
+    ('Live', 'Live'),
+    ('(Live)', '(Live)'),
+])
+def test_clean_track_name(track_name, expected):
+    assert clean_track_name(track_name) == expected
+
+@pytest.mark.parametrize('artist_name, expected', [
+    ('Queen', 'Queen'),
+    ('Artist feat. Someone', 'Artist'),
+    ('Artist (with Someone)', 'Artist'),
+    ('Simon & Garfunkel', 'Simon & Garfunkel'),
+])
+def test_clean_artist_name(artist_name, expected):
+    assert clean_artist_name(artist_name) == expected
+
+@pytest.mark.parametrize('first, second, same', [
+    (('Queen', 'Bohemian Rhapsody'), ('Queen', 'Bohemian Rhapsody - 2011 Remaster'), True),
+    (('Queen', 'Bohemian Rhapsody'), ('queen', '  bohemian   RHAPSODY '), True),
+    (('Adele', 'Hello'), ('Adele', 'Hello (Live)'), True),
+    (('Artist', 'Song'), ('Artist feat. Someone', 'Song (feat. Someone)'), True),
+    (('Adele', 'Hello'), ('Lionel Richie', 'Hello'), False),
+    (('Artist', 'Song'), ('Artist', 'Song - Japanese Version'), False),
+    (('Artist', 'Song'), ('Artist', 'Song (Remix)'), False),
+])
+def test_canonical_key(first, second, same):
+    assert (canonical_key(*first) == canonical_key(*second)) is same
+
+def test_song_aliases_most_specific_first():
+    assert song_aliases('Queen', 'Bohemian Rhapsody - 2011 Remaster', track_id='abc', isrc='gbum71029604') == [
+        'spotify:abc',
+        'isrc:GBUM71029604',
+        f"key:{canonical_key('Queen', 'Bohemian Rhapsody')}",
+    ]
+    assert song_aliases('Queen', 'Bohemian Rhapsody') == [f"key:{canonical_key('Queen', 'Bohemian Rhapsody')}"]
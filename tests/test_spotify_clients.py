@@ -0,0 +1,63 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import pytest
+import spotipy
+
+from spotify_clients import NowPlayingCache, NowPlayingWatcher, SpotifyClientRegistry, TooManySubscribers
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        self.send_response(429)
+        self.send_header('Retry-After', '2')
+        self.send_header('Content-Type', 'application/json')
+        body = b'{"error": {"status": 429, "message": "API rate limit exceeded"}}'
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def rate_limited_server():
+    RateLimitedHandler.hits = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RateLimitedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_429_reaches_now_playing_cache_without_retries(rate_limited_server):
+    spotify = spotipy.Spotify(auth='token', requests_session=SpotifyClientRegistry.make_requests_session(4))
+    spotify.prefix = rate_limited_server
+    cache = NowPlayingCache(ttl=0)
+
+    started = time.monotonic()
+    assert cache.get('user', spotify.current_user_playing_track) is None
+    assert time.monotonic() - started < 1
+    assert RateLimitedHandler.hits == 1
+    assert cache.rate_limited == 1
+    # Blocked for Retry-After: served from the cache without another upstream call
+    cache.get('user', spotify.current_user_playing_track)
+    assert RateLimitedHandler.hits == 1
+
+
+def test_watcher_refuses_subscribers_over_the_limit():
+    watcher = NowPlayingWatcher(NowPlayingCache(), max_subscribers=2)
+    first = watcher.subscribe('user', lambda: None)
+    watcher.subscribe('other', lambda: None)
+    with pytest.raises(TooManySubscribers):
+        watcher.subscribe('user', lambda: None)
+    watcher.unsubscribe('user', first)
+    watcher.unsubscribe('user', first)
+    watcher.subscribe('third', lambda: None)
+    assert watcher.stats()['subscribers'] == 2
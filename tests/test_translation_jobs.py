@@ -0,0 +1,22 @@
+import threading
+
+import pytest
+
+from translation_jobs import QueueFull, TranslationJobQueue
+
+
+def test_background_jobs_leave_headroom_for_requests():
+    release = threading.Event()
+    queue = TranslationJobQueue(lambda job: release.wait(5) and 'translated', max_workers=1, max_pending=4)
+    try:
+        queue.submit('a', 'Artist', 'A', source='prefetch', max_pending=2)
+        queue.submit('b', 'Artist', 'B', source='prefetch', max_pending=2)
+        with pytest.raises(QueueFull):
+            queue.submit('c', 'Artist', 'C', source='prefetch', max_pending=2)
+        queue.submit('c', 'Artist', 'C')
+        queue.submit('d', 'Artist', 'D')
+        with pytest.raises(QueueFull):
+            queue.submit('e', 'Artist', 'E')
+    finally:
+        release.set()
+        queue.shutdown()
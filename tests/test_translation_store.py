@@ -0,0 +1,44 @@
+import threading
+
+from translation_store import TranslationStore
+
+
+def test_connections_of_finished_threads_are_released(tmp_path):
+    store = TranslationStore(str(tmp_path / 'translations.db'))
+    store.init_schema()
+    store.save('song', 'Artist', 'Track', 'translated')
+    results = []
+
+    def read():
+        results.append(store.get('song'))
+
+    for _ in range(20):
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+    assert results == ['translated'] * 20
+    # Only the main thread's connection is left
+    assert len(store._connections) == 1
+    store.close()
+    assert len(store._connections) == 0
+
+
+def test_search_index_follows_genius_lyrics_changes(tmp_path):
+    store = TranslationStore(str(tmp_path / 'translations.db'))
+    store.init_schema()
+    store.save_lyrics('key', 'Queen', 'Bohemian Rhapsody', 1, 'Is this the real life')
+    store.save('song', 'Queen', 'Bohemian Rhapsody', 'これは現実か', 'v1')
+    store.save('variant', 'Queen', 'Bohemian Rhapsody - Remastered', 'これは現実か', 'v1')
+    assert [row[1] for row in store.search('real life')] == ['song']
+
+    store.save_lyrics('key', 'Queen', 'Bohemian Rhapsody', 1, 'Mama, just killed a man')
+    store.save('song', 'Queen', 'Bohemian Rhapsody', '新しい訳', 'v2')
+    # Same lyrics key, so this replaces the row the first song was indexed with
+    store.save_lyrics('key', 'Queen', 'Bohemian Rhapsody - Remastered', 1, 'Galileo')
+    assert list(store.search('real life')) == []
+    assert list(store.search('killed a man')) == []
+    assert [row[1] for row in store.search('Galileo')] == ['variant']
+    assert [row[1] for row in store.search('新しい訳')] == ['song']
+    # The external-content index matches what it would index from the tables now
+    store.conn.execute("INSERT INTO translations_fts (translations_fts) VALUES ('integrity-check')")
+    store.close()
@@ -0,0 +1,185 @@
+"""Background translation jobs.
+
+A cold /lyrics request can take tens of seconds (Genius scrape + Gemini). In
+job mode the request only enqueues the work and returns a job id; a bounded
+worker pool runs the pipeline and clients poll the job or subscribe to its
+Server-Sent Events stream.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import uuid
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+NOT_FOUND = 'not_found'
+ERROR = 'error'
+FINISHED_STATES = (DONE, NOT_FOUND, ERROR)
+
+class QueueFull(Exception):
+    """Raised when the job queue already holds max_pending unfinished jobs."""
+
+class TranslationJob:
+    """State of one queued translation, shared between the worker and readers."""
+
+    def __init__(self, key, artist_name, track_name, remote_address=None, source='request'):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.artist_name = artist_name
+        self.track_name = track_name
+        self.remote_address = remote_address
+        # 'request' for user-facing jobs, 'prefetch' for background warming
+        self.source = source
+        self.status = QUEUED
+        self.translated_lyrics = None
+        self.partial_text = ''
+        self.error_message = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Bumped on every change so readers can wait for "anything new"
+        self.version = 0
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    @property
+    def elapsed(self):
+        """Seconds from enqueue to finish (or until now if still running)."""
+        end = self.finished_at or time.time()
+        return end - self.created_at
+
+    def _set(self, **changes):
+        with self._cond:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._cond.notify_all()
+
+    def append_text(self, text):
+        """Append streamed translation output; readers see it via partial_text."""
+        with self._cond:
+            self.partial_text += text
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait(self, timeout=None, seen_version=None):
+        """Block until the job changes after seen_version or finishes.
+
+        Returns True if the job changed within timeout.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.finished or self.version != seen_version, timeout)
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'artist': self.artist_name,
+            'track': self.track_name,
+        }
+        if self.status == DONE:
+            data['translated_lyrics'] = self.translated_lyrics
+        elif self.status == NOT_FOUND:
+            data['translated_lyrics'] = 'Lyrics not found'
+        elif self.status == ERROR:
+            data['translated_lyrics'] = ''
+            data['error_message'] = self.error_message
+        if self.finished:
+            data['get_lyrics_time'] = f"{self.elapsed:.2f}"
+        return data
+
+class TranslationJobQueue:
+    """Bounded worker pool for translation jobs, deduplicated by song key.
+
+    run(job) is called on a worker thread and must return the translated
+    lyrics, or None if no lyrics were found. on_finish(job), if given, is
+    called after every job finishes.
+    """
+
+    def __init__(self, run, max_workers=4, max_pending=64, retention=600, on_finish=None):
+        self.run = run
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self.on_finish = on_finish
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='translation-job')
+        self._lock = threading.Lock()
+        self._jobs = {}        # job id -> job
+        self._active = {}      # song key -> unfinished job
+        self.submitted = 0
+        self.deduplicated = 0
+
+    def submit(self, key, artist_name, track_name, remote_address=None, source='request',
+               max_pending=None):
+        """Enqueue a job for key, or return the unfinished job already queued for it.
+
+        max_pending lowers the limit for this job: background jobs pass a
+        smaller one so that they cannot fill the queue user requests need.
+        """
+        limit = self.max_pending if max_pending is None else min(max_pending, self.max_pending)
+        with self._lock:
+            self._prune()
+            job = self._active.get(key)
+            if job is not None:
+                self.deduplicated += 1
+                return job
+            if len(self._active) >= limit:
+                raise QueueFull(f"{len(self._active)} translation jobs already pending")
+            job = TranslationJob(key, artist_name, track_name, remote_address, source)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self.submitted += 1
+        self._executor.submit(self._execute, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _execute(self, job):
+        job._set(status=RUNNING, started_at=time.time())
+        try:
+            translated_lyrics = self.run(job)
+            if translated_lyrics is None:
+                job._set(status=NOT_FOUND, finished_at=time.time())
+            else:
+                job._set(status=DONE, translated_lyrics=translated_lyrics, finished_at=time.time())
+        except Exception as e:
+            job._set(status=ERROR, error_message=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+        if self.on_finish is not None:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                print(f"Translation job callback error: {e}")
+
+    def _prune(self):
+        # Called with self._lock held: forget finished jobs past their retention.
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': len(self._active),
+                'tracked': len(self._jobs),
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+            }
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,602 @@
+"""SQLite-backed store for translated lyrics.
+
+Each thread keeps its own long-lived connection instead of opening a new one
+per call; it is closed when the thread exits, so servers that start a thread
+per request do not pile up open connections. The database runs in WAL mode so readers are never blocked by a
+writer, and writes can be grouped into a single transaction with save_many().
+Several processes (server workers, spolyfy_warm.py) can share the database
+file. Connections are never carried across a fork: a child process opens
+its own.
+Every translation records the model+prompt version that produced it, so
+callers can tell stale entries apart after a model or prompt change.
+Stanza-level translations (see stanzas.py) live in their own table, and the
+raw lyrics scraped from Genius are kept in genius_lyrics so that songs can be
+translated again without another Genius search. Songs Genius could not find
+are remembered in lyrics_not_found for a while, so they are not searched
+for on every request. song_aliases maps other identities of a song (its
+canonical name key, Spotify track id or ISRC, see song_identity.py) to the
+id of a stored translation.
+
+translations_fts is an FTS5 index over artist, track, original and translated
+lyrics, kept in sync with the translations and genius_lyrics tables by
+triggers. It reads the text from those tables instead of keeping a copy.
+search() and browse() page through it (and the table) with keyset cursors.
+
+HotCache is a small in-process LRU tier that sits in front of the store so the
+most requested songs are served without touching SQLite at all.
+"""
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+# Statements are kept as module constants so sqlite3's per-connection statement
+# cache can reuse the prepared statements across calls.
+CREATE_TRANSLATIONS_SQL = '''
+CREATE TABLE IF NOT EXISTS translations (
+    id TEXT PRIMARY KEY,
+    artist TEXT NOT NULL,
+    track TEXT NOT NULL,
+    translated_lyrics TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    version TEXT
+)
+'''
+CREATE_STANZA_TRANSLATIONS_SQL = '''
+CREATE TABLE IF NOT EXISTS stanza_translations (
+    hash TEXT PRIMARY KEY,
+    original TEXT NOT NULL,
+    translated TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    version TEXT
+)
+'''
+CREATE_GENIUS_LYRICS_SQL = '''
+CREATE TABLE IF NOT EXISTS genius_lyrics (
+    lyrics_key TEXT PRIMARY KEY,
+    artist TEXT NOT NULL,
+    track TEXT NOT NULL,
+    genius_song_id INTEGER,
+    lyrics TEXT NOT NULL,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+CREATE_LYRICS_NOT_FOUND_SQL = '''
+CREATE TABLE IF NOT EXISTS lyrics_not_found (
+    lyrics_key TEXT PRIMARY KEY,
+    artist TEXT NOT NULL,
+    track TEXT NOT NULL,
+    checked_at REAL NOT NULL
+)
+'''
+CREATE_SONG_ALIASES_SQL = '''
+CREATE TABLE IF NOT EXISTS song_aliases (
+    alias TEXT PRIMARY KEY,
+    song_id TEXT NOT NULL
+)
+'''
+# Full-text index. The trigram tokenizer matches substrings, which also works
+# for Japanese text without word boundaries; older SQLite builds fall back
+# to unicode61 (whole-word matches). It is an external-content index: the
+# text is read from translations_fts_content (translations plus the Genius
+# lyrics of the song) instead of being stored a second time, and rows share
+# the rowid of their translations row.
+#
+# FTS5 removes an external-content row by being given the values it indexed,
+# so the triggers below pass the old values. INSERT OR REPLACE does not fire
+# delete triggers, so the old row is removed before the insert. When Genius
+# lyrics change, the translations of that song are taken out of the index
+# with the old lyrics and put back with the new ones; their rowids are kept
+# in translations_fts_pending (empty outside a statement) in between.
+CREATE_TRANSLATIONS_FTS_SQL = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS translations_fts USING fts5(
+    song_id UNINDEXED, artist, track, original, translated, tokenize='{tokenizer}',
+    content='translations_fts_content', content_rowid='translation_rowid'
+)
+'''
+FTS_TOKENIZERS = ('trigram', 'unicode61 remove_diacritics 2')
+ORIGINAL_LYRICS_SQL = '''COALESCE((SELECT lyrics FROM genius_lyrics
+              WHERE genius_lyrics.artist = {row}.artist AND genius_lyrics.track = {row}.track LIMIT 1), '')'''
+CREATE_TRANSLATIONS_FTS_CONTENT_SQL = (
+    f'''CREATE VIEW IF NOT EXISTS translations_fts_content AS
+    SELECT rowid AS translation_rowid, id AS song_id, artist, track,
+           {ORIGINAL_LYRICS_SQL.format(row='translations')} AS original, translated_lyrics AS translated
+    FROM translations''',
+    'CREATE TABLE IF NOT EXISTS translations_fts_pending (translation_rowid INTEGER PRIMARY KEY)',
+)
+FTS_INSERT_SQL = 'INSERT INTO translations_fts (rowid, song_id, artist, track, original, translated)'
+FTS_DELETE_SQL = 'INSERT INTO translations_fts (translations_fts, rowid, song_id, artist, track, original, translated)'
+FTS_ROW_VALUES_SQL = '''VALUES ({row}.rowid, {row}.id, {row}.artist, {row}.track, {original},
+                {row}.translated_lyrics)'''
+FTS_DELETE_ROW_VALUES_SQL = '''VALUES ('delete', {row}.rowid, {row}.id, {row}.artist, {row}.track, {original},
+                {row}.translated_lyrics)'''
+CREATE_TRANSLATIONS_FTS_TRIGGERS_SQL = (
+    f'''CREATE TRIGGER IF NOT EXISTS translations_fts_before_insert BEFORE INSERT ON translations BEGIN
+        {FTS_DELETE_SQL}
+        SELECT 'delete', translation_rowid, song_id, artist, track, original, translated
+        FROM translations_fts_content WHERE song_id = NEW.id;
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS translations_fts_after_insert AFTER INSERT ON translations BEGIN
+        {FTS_INSERT_SQL}
+        {FTS_ROW_VALUES_SQL.format(row='NEW', original=ORIGINAL_LYRICS_SQL.format(row='NEW'))};
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS translations_fts_after_delete AFTER DELETE ON translations BEGIN
+        {FTS_DELETE_SQL}
+        {FTS_DELETE_ROW_VALUES_SQL.format(row='OLD', original=ORIGINAL_LYRICS_SQL.format(row='OLD'))};
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS translations_fts_after_update AFTER UPDATE ON translations BEGIN
+        {FTS_DELETE_SQL}
+        {FTS_DELETE_ROW_VALUES_SQL.format(row='OLD', original=ORIGINAL_LYRICS_SQL.format(row='OLD'))};
+        {FTS_INSERT_SQL}
+        {FTS_ROW_VALUES_SQL.format(row='NEW', original=ORIGINAL_LYRICS_SQL.format(row='NEW'))};
+    END''',
+)
+# Translations whose original lyrics a genius_lyrics change affects: the
+# song itself, and for INSERT OR REPLACE the song whose row it replaces
+GENIUS_LYRICS_FTS_AFFECTED_SQL = {
+    'INSERT': '''(artist = NEW.artist AND track = NEW.track)
+               OR (artist, track) IN (SELECT artist, track FROM genius_lyrics WHERE lyrics_key = NEW.lyrics_key)''',
+    'DELETE': 'artist = OLD.artist AND track = OLD.track',
+}
+CREATE_GENIUS_LYRICS_FTS_TRIGGERS_SQL = tuple(
+    sql
+    for event, affected in GENIUS_LYRICS_FTS_AFFECTED_SQL.items()
+    for sql in (
+        f'''CREATE TRIGGER IF NOT EXISTS translations_fts_genius_before_{event.lower()}
+        BEFORE {event} ON genius_lyrics BEGIN
+            INSERT OR IGNORE INTO translations_fts_pending (translation_rowid)
+            SELECT rowid FROM translations WHERE {affected};
+            {FTS_DELETE_SQL}
+            SELECT 'delete', translation_rowid, song_id, artist, track, original, translated
+            FROM translations_fts_content
+            WHERE translation_rowid IN (SELECT translation_rowid FROM translations_fts_pending);
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS translations_fts_genius_after_{event.lower()}
+        AFTER {event} ON genius_lyrics BEGIN
+            {FTS_INSERT_SQL}
+            SELECT translation_rowid, song_id, artist, track, original, translated
+            FROM translations_fts_content
+            WHERE translation_rowid IN (SELECT translation_rowid FROM translations_fts_pending);
+            DELETE FROM translations_fts_pending;
+        END''',
+    )
+)
+REBUILD_TRANSLATIONS_FTS_SQL = "INSERT INTO translations_fts (translations_fts) VALUES ('rebuild')"
+CREATE_INDEXES_SQL = (
+    # Original lyrics lookup in the FTS triggers
+    'CREATE INDEX IF NOT EXISTS genius_lyrics_artist_track ON genius_lyrics (artist, track)',
+    # Keyset pagination of /library
+    'CREATE INDEX IF NOT EXISTS translations_artist_track ON translations (artist, track, id)',
+)
+FTS_COLUMNS = ('artist', 'track', 'original', 'translated')
+# Trigram matching needs at least three characters
+FTS_MIN_QUERY_LENGTH = 3
+
+# Columns added after the first release; existing databases are migrated in
+# init_schema(). Rows written before versioning have a NULL version.
+MIGRATION_COLUMNS = (
+    ('translations', 'version', 'TEXT'),
+    ('stanza_translations', 'version', 'TEXT'),
+)
+SELECT_TRANSLATION_SQL = 'SELECT translated_lyrics, version FROM translations WHERE id = ?'
+UPSERT_TRANSLATION_SQL = '''
+INSERT OR REPLACE INTO translations (id, artist, track, translated_lyrics, version)
+VALUES (?, ?, ?, ?, ?)
+'''
+UPSERT_STANZA_SQL = '''
+INSERT OR REPLACE INTO stanza_translations (hash, original, translated, version)
+VALUES (?, ?, ?, ?)
+'''
+SELECT_LYRICS_SQL = 'SELECT genius_song_id, lyrics FROM genius_lyrics WHERE lyrics_key = ?'
+UPSERT_LYRICS_SQL = '''
+INSERT OR REPLACE INTO genius_lyrics (lyrics_key, artist, track, genius_song_id, lyrics)
+VALUES (?, ?, ?, ?, ?)
+'''
+# SQLite's default limit on bound parameters is 999 in older builds
+STANZA_LOOKUP_CHUNK = 500
+
+# Stores whose connections a forked child must not use (see _forget_connections)
+_stores = weakref.WeakSet()
+
+def _reset_stores_after_fork():
+    for store in list(_stores):
+        store._forget_connections()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_stores_after_fork)
+
+class _ThreadConnection:
+    # Holds a thread's connection in its threading.local. sqlite3 connections
+    # cannot be weakly referenced, so the store tracks these holders instead;
+    # when the thread exits the holder is freed and its finalizer closes the
+    # connection. (Left to the garbage collector, connections sit in reference
+    # cycles with their statement cache and keep their files open.)
+    __slots__ = ('conn', 'finalizer', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.finalizer = weakref.finalize(self, conn.close)
+
+class TranslationStore:
+    """Thread-local SQLite connections with WAL journaling and tuned pragmas."""
+
+    def __init__(self, db_path, cache_size_kib=8192, mmap_size=64 * 1024 * 1024,
+                 busy_timeout_ms=5000, cached_statements=64):
+        self.db_path = db_path
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()  # _ThreadConnection of live threads
+        self._lock = threading.Lock()
+        # Set by init_schema(): 'trigram', 'unicode61', or None without FTS5
+        self.fts_tokenizer = None
+        _stores.add(self)
+
+    def _forget_connections(self):
+        # In a forked child the parent's connections (and the lock, if it was
+        # held during the fork) belong to the parent; they are dropped
+        # without closing, and the child connects again on first use.
+        for holder in list(self._connections):
+            holder.finalizer.detach()
+        self._local = threading.local()
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Only the owning thread uses a connection; check_same_thread is off
+        # so that close() and the thread-exit finalizer can close it.
+        conn = sqlite3.connect(self.db_path,
+                               timeout=self.busy_timeout_ms / 1000,
+                               cached_statements=self.cached_statements,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # NORMAL is durable across application crashes in WAL mode and avoids
+        # an fsync on every commit.
+        conn.execute('PRAGMA synchronous=NORMAL')
+        # Negative cache_size is in KiB rather than pages.
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kib)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        return conn
+
+    @property
+    def conn(self):
+        """The calling thread's connection, opened on first use."""
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            holder = _ThreadConnection(self._connect())
+            self._local.holder = holder
+            with self._lock:
+                self._connections.add(holder)
+        return holder.conn
+
+    def init_schema(self):
+        """Create the translation and lyrics tables if they do not exist yet.
+
+        Returns the (table, column) pairs of MIGRATION_COLUMNS that were just
+        added, so callers can run one-off cleanups that belong to a migration.
+        """
+        conn = self.conn
+        added = []
+        conn.execute(CREATE_TRANSLATIONS_SQL)
+        conn.execute(CREATE_STANZA_TRANSLATIONS_SQL)
+        conn.execute(CREATE_GENIUS_LYRICS_SQL)
+        conn.execute(CREATE_LYRICS_NOT_FOUND_SQL)
+        conn.execute(CREATE_SONG_ALIASES_SQL)
+        for table, column, declaration in MIGRATION_COLUMNS:
+            columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+            if column not in columns:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+                added.append((table, column))
+        for sql in CREATE_INDEXES_SQL:
+            conn.execute(sql)
+        conn.commit()
+        self._init_search(conn)
+        return added
+
+    def _init_search(self, conn):
+        """Create the full-text index and its triggers, building it on first run."""
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'translations_fts'").fetchone()
+        if row is not None and 'content=' not in row[0]:
+            # Index from before external content, holding its own copy of every lyric
+            conn.execute('BEGIN')
+            with conn:
+                triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                                        "AND name LIKE 'translations_fts_%'").fetchall()
+                for (name,) in triggers:
+                    conn.execute(f'DROP TRIGGER {name}')
+                conn.execute('DROP TABLE translations_fts')
+            print("Search index dropped, rebuilding it without a copy of the lyrics")
+            row = None
+        if row is None:
+            # In one transaction, so an interrupted run never leaves an index without triggers
+            conn.execute('BEGIN')
+            with conn:
+                for tokenizer in FTS_TOKENIZERS:
+                    try:
+                        conn.execute(CREATE_TRANSLATIONS_FTS_SQL.format(tokenizer=tokenizer))
+                        break
+                    except sqlite3.OperationalError:
+                        continue
+                else:
+                    print("SQLite has no FTS5 support; search is disabled")
+                    self.fts_tokenizer = None
+                    return
+                for sql in (CREATE_TRANSLATIONS_FTS_CONTENT_SQL + CREATE_TRANSLATIONS_FTS_TRIGGERS_SQL
+                            + CREATE_GENIUS_LYRICS_FTS_TRIGGERS_SQL):
+                    conn.execute(sql)
+                conn.execute(REBUILD_TRANSLATIONS_FTS_SQL)
+                indexed = conn.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+            self.fts_tokenizer = tokenizer.split()[0]
+            print(f"Search index created ({self.fts_tokenizer}), {indexed} translations indexed")
+        else:
+            self.fts_tokenizer = self._tokenizer_of(row[0])
+
+    @staticmethod
+    def _tokenizer_of(fts_sql):
+        return 'trigram' if 'trigram' in fts_sql else 'unicode61'
+
+    def load_schema(self):
+        """Pick up a schema that init_schema() set up in another process, without changing it."""
+        row = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'translations_fts'").fetchone()
+        self.fts_tokenizer = self._tokenizer_of(row[0]) if row is not None else None
+
+    def get(self, song_id):
+        """Return the translated lyrics for song_id, or None if not stored."""
+        row = self.get_entry(song_id)
+        return row[0] if row else None
+
+    def get_entry(self, song_id):
+        """Return (translated_lyrics, version) for song_id, or None if not stored."""
+        return self.conn.execute(SELECT_TRANSLATION_SQL, (song_id,)).fetchone()
+
+    def save(self, song_id, artist_name, track_name, translated_lyrics, version=None):
+        """Insert or replace a single translation."""
+        self.save_many([(song_id, artist_name, track_name, translated_lyrics, version)])
+
+    def save_many(self, rows):
+        """Insert or replace (song_id, artist, track, translated_lyrics, version) rows in one commit."""
+        conn = self.conn
+        with conn:
+            conn.executemany(UPSERT_TRANSLATION_SQL, rows)
+
+    def delete_translations_starting_with(self, prefix):
+        """Delete translations whose text starts with prefix; returns the number deleted."""
+        conn = self.conn
+        with conn:
+            cursor = conn.execute('DELETE FROM translations WHERE substr(translated_lyrics, 1, ?) = ?',
+                                  (len(prefix), prefix))
+        return cursor.rowcount
+
+    def get_aliases(self, aliases):
+        """Return {alias: song_id} for the given aliases that are stored."""
+        aliases = list(aliases)
+        if not aliases:
+            return {}
+        placeholders = ','.join('?' * len(aliases))
+        return dict(self.conn.execute(
+            f'SELECT alias, song_id FROM song_aliases WHERE alias IN ({placeholders})', aliases))
+
+    def save_aliases(self, rows, replace=True):
+        """Store (alias, song_id) rows in one commit; without replace, existing aliases are kept."""
+        conn = self.conn
+        with conn:
+            conn.executemany(f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO song_aliases (alias, song_id) "
+                             "VALUES (?, ?)", rows)
+
+    def has_aliases(self):
+        return self.conn.execute('SELECT 1 FROM song_aliases LIMIT 1').fetchone() is not None
+
+    def iter_translations(self):
+        """Yield (song_id, artist, track) for every stored translation."""
+        # fetchall() so the caller can write to the database while iterating
+        yield from self.conn.execute('SELECT id, artist, track FROM translations').fetchall()
+
+    def search(self, query, column=None, limit=50, before=None):
+        """Yield (rowid, song_id, artist, track, version, created_at, snippet) matching query, newest first.
+
+        column restricts the match to one of FTS_COLUMNS. before is the rowid
+        of the last row of the previous page. Rows are produced lazily, so a
+        page never needs more than one row in memory.
+        """
+        if column is not None and column not in FTS_COLUMNS:
+            raise ValueError(f"unknown search column {column!r}")
+        before = before if before is not None else 2 ** 63 - 1
+        if self.fts_tokenizer is None or (self.fts_tokenizer == 'trigram' and len(query) < FTS_MIN_QUERY_LENGTH):
+            # Too short for the index: scan artist and track names only
+            pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            columns = [column] if column in ('artist', 'track') else ['artist', 'track']
+            where = ' OR '.join(f"{name} LIKE ? ESCAPE '\\'" for name in columns)
+            yield from self.conn.execute(
+                f'''SELECT rowid, id, artist, track, version, created_at, NULL FROM translations
+                    WHERE ({where}) AND rowid < ? ORDER BY rowid DESC LIMIT ?''',
+                [pattern] * len(columns) + [before, limit])
+            return
+        # Quote the query as one phrase so FTS5 syntax in user input is inert
+        match = '"' + query.replace('"', '""') + '"'
+        if column is not None:
+            match = f"{column} : {match}"
+        yield from self.conn.execute(
+            '''SELECT f.rowid, f.song_id, f.artist, f.track, t.version, t.created_at,
+                      snippet(translations_fts, -1, '[', ']', '…', 40)
+               FROM translations_fts AS f JOIN translations AS t ON t.rowid = f.rowid
+               WHERE translations_fts MATCH ? AND f.rowid < ?
+               ORDER BY f.rowid DESC LIMIT ?''',
+            (match, before, limit))
+
+    def browse(self, limit=50, after=None, artist=None):
+        """Yield (song_id, artist, track, version, created_at) ordered by artist and track.
+
+        after is the (artist, track, song_id) of the last row of the previous
+        page; artist restricts the listing to one artist.
+        """
+        conditions, params = [], []
+        if artist is not None:
+            conditions.append('artist = ?')
+            params.append(artist)
+        if after is not None:
+            conditions.append('(artist, track, id) > (?, ?, ?)')
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        yield from self.conn.execute(
+            f'''SELECT id, artist, track, version, created_at FROM translations {where}
+                ORDER BY artist, track, id LIMIT ?''',
+            params + [limit])
+
+    def get_stanzas(self, hashes, version=None):
+        """Return {hash: translated} for the stanza hashes cached with the given version."""
+        hashes = list(hashes)
+        found = {}
+        for i in range(0, len(hashes), STANZA_LOOKUP_CHUNK):
+            chunk = hashes[i:i + STANZA_LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f'SELECT hash, translated FROM stanza_translations WHERE hash IN ({placeholders}) AND version IS ?',
+                [*chunk, version])
+            found.update(rows)
+        return found
+
+    def save_stanzas(self, rows):
+        """Insert or replace (hash, original, translated, version) stanza rows in one commit."""
+        conn = self.conn
+        with conn:
+            conn.executemany(UPSERT_STANZA_SQL, rows)
+
+    def get_lyrics(self, lyrics_key):
+        """Return (genius_song_id, lyrics) cached for lyrics_key, or None."""
+        return self.conn.execute(SELECT_LYRICS_SQL, (lyrics_key,)).fetchone()
+
+    def save_lyrics(self, lyrics_key, artist_name, track_name, genius_song_id, lyrics):
+        """Insert or replace the Genius lyrics of one song."""
+        conn = self.conn
+        with conn:
+            conn.execute(UPSERT_LYRICS_SQL, (lyrics_key, artist_name, track_name, genius_song_id, lyrics))
+            conn.execute('DELETE FROM lyrics_not_found WHERE lyrics_key = ?', (lyrics_key,))
+
+    def is_not_found(self, lyrics_key, ttl):
+        """Whether Genius found no lyrics for lyrics_key within the last ttl seconds."""
+        row = self.conn.execute('SELECT checked_at FROM lyrics_not_found WHERE lyrics_key = ?',
+                                (lyrics_key,)).fetchone()
+        return row is not None and time.time() - row[0] < ttl
+
+    def save_not_found(self, lyrics_key, artist_name, track_name):
+        """Remember that Genius has no lyrics for lyrics_key (as of now)."""
+        conn = self.conn
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO lyrics_not_found (lyrics_key, artist, track, checked_at) '
+                         'VALUES (?, ?, ?, ?)', (lyrics_key, artist_name, track_name, time.time()))
+
+    def iter_lyrics(self):
+        """Yield (artist, track) for every song with cached Genius lyrics."""
+        # fetchall() so the caller can write to the database while iterating
+        yield from self.conn.execute('SELECT artist, track FROM genius_lyrics ORDER BY fetched_at').fetchall()
+
+    def close(self):
+        """Close every connection opened by this store."""
+        with self._lock:
+            holders, self._connections = list(self._connections), weakref.WeakSet()
+        for holder in holders:
+            holder.finalizer()
+        self._local = threading.local()
+
+
+class HotCache:
+    """Bounded in-memory LRU cache with an optional TTL.
+
+    Entries are bounded both by count and by the total UTF-8 size of the cached
+    strings. An entry can be put in a group, so that all entries of a group
+    are dropped together with invalidate_group(). Hit, miss and eviction
+    counters are kept for monitoring.
+    """
+
+    def __init__(self, max_entries=500, max_bytes=32 * 1024 * 1024, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, expires_at, group)
+        self._groups = {}  # group -> keys in it
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, group=None):
+        """Cache value under key, evicting least recently used entries as needed."""
+        size = len(value.encode('utf-8'))
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at, group)
+            self._bytes += size
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop key from the cache if present."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_group(self, group):
+        """Drop every entry put in group."""
+        with self._lock:
+            for key in list(self._groups.get(group, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _, group = self._entries.pop(key)
+        self._bytes -= size
+        if group is not None:
+            keys = self._groups[group]
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+    def stats(self):
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
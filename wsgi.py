@@ -0,0 +1,10 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every worker process imports this module and initializes its own clients,
+database connections and access log.
+"""
+from spolyfy_app import create_app
+
+app = create_app()